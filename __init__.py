@@ -3,13 +3,14 @@ Author: cg8-5712
 Date: 2025-05-02
 Version: 1.5.0
 License: GPL-3.0
-LastEditTime: 2025-05-02 17:45
+LastEditTime: 2025-07-21 16:10
 Title: eAIP Chart Query Plugin
 Description: This plugin allows users to query aeronautical charts using airport ICAO codes.
 """
 
-from nonebot import on_command, require
+from nonebot import on_command, require, get_driver
 require("nonebot_plugin_waiter")
+require("nonebot_plugin_htmlrender")
 from nonebot.plugin import PluginMetadata
 from nonebot.params import CommandArg
 from nonebot.rule import to_me
@@ -18,15 +19,18 @@ from nonebot.adapters import Bot
 from nonebot.adapters.onebot.v11 import GroupMessageEvent
 from nonebot_plugin_waiter import prompt_until
 from nonebot_plugin_alconna import At, Text
-from nonebot_plugin_htmlrender import template_to_pic
+import asyncio
+import importlib
 import shlex
+from pathlib import Path
+from typing import Optional
 
 from zhenxun.configs.path_config import TEMPLATE_PATH
 from zhenxun.configs.config import Config
 from zhenxun.configs.utils import PluginExtraData, RegisterConfig
 from zhenxun.utils.message import MessageUtils
 from zhenxun.services.log import logger
-from .eaip import EaipHandler
+from .eaip_render import RenderOptions, parse_region, parse_pages
 
 # Define supported chart types
 CHART_TYPES = [
@@ -40,16 +44,23 @@ __plugin_meta__ = PluginMetadata(
     usage="""
     Commands:
         @Bot eaip [ICAO code]: Display chart list as image
+        @Bot eaip [Airport or city name]: Suggest the ICAO codes of matching airports
         @Bot eaip [ICAO code] --raw: Display chart list as text
+        @Bot eaip [ICAO code] --sheet: Display chart list as thumbnail contact sheet
         @Bot eaip [ICAO code] [Chart type]: Display charts of specified type
         @Bot eaip [ICAO code] [Runway]: Display runway-related charts
         @Bot eaip [ICAO code] -s [File number]: Display specific chart
         @Bot eaip [ICAO code] -c [code]: Match charts by code
         @Bot eaip [ICAO code] -f [keyword]: Search charts by filename keyword
+        @Bot eaip [ICAO code] ... -r [Region]: Render only a region of the chart
+        @Bot eaip [ICAO code] ... -p [Pages]: Select chart page(s), e.g. 2 or 1-3
+        @Bot eaip [ICAO code] ... --pdf: Send chart page(s) as PDF file instead of image
         @Bot eaip set [Period]: Update AIRAC period (admin only)
     Supported chart types:
         ADC, APDC, GMC, DGS, AOC, PATC, FDA, ATCMAS, SID, STAR,
         WAYPOINT LIST, DATABASE CODING TABLE, IAC, ATCSMAC
+    Supported regions:
+        tl, tr, bl, br, top, bottom, or a clip rectangle x0,y0,x1,y1 (0-1)
     """,
     extra=PluginExtraData(
         version="1.0.0",
@@ -65,7 +76,35 @@ __plugin_meta__ = PluginMetadata(
                 key="DIR_NAME",
                 value="EAIP2025-05.V1.3",
                 help="Directory path (EAIP2025-05.V1.3)",
-                default_value="EAIP2025-05.V1.3",)
+                default_value="EAIP2025-05.V1.3",),
+            RegisterConfig(
+                module="eaip",
+                key="WARM_UP",
+                value=True,
+                help="Load renderer and chart handler in background after startup",
+                default_value=True,
+                type=bool,),
+            RegisterConfig(
+                module="eaip",
+                key="PREFETCH_COUNT",
+                value=2,
+                help="Charts rendered in background while waiting for a selection (0 disables)",
+                default_value=2,
+                type=int,),
+            RegisterConfig(
+                module="eaip",
+                key="SHARED_CACHE",
+                value="",
+                help="Render cache shared between bot processes: file, memory, or empty to disable",
+                default_value="",
+                type=str,),
+            RegisterConfig(
+                module="eaip",
+                key="SHARED_CACHE_MB",
+                value=512,
+                help="Size limit of the shared render cache in MB",
+                default_value=512,
+                type=int,)
         ]).to_dict(),
 )
 
@@ -85,13 +124,122 @@ Config.add_plugin_config(
     type=str
 )
 
-eaip_handler = EaipHandler()
+Config.add_plugin_config(
+    "eaip",
+    "WARM_UP",
+    True,
+    help="Load renderer and chart handler in background after startup",
+    type=bool
+)
+
+Config.add_plugin_config(
+    "eaip",
+    "PREFETCH_COUNT",
+    2,
+    help="Charts rendered in background while waiting for a selection (0 disables)",
+    type=int
+)
+
+Config.add_plugin_config(
+    "eaip",
+    "SHARED_CACHE",
+    "",
+    help="Render cache shared between bot processes: file, memory, or empty to disable",
+    type=str
+)
+
+Config.add_plugin_config(
+    "eaip",
+    "SHARED_CACHE_MB",
+    512,
+    help="Size limit of the shared render cache in MB",
+    type=int
+)
+
+# The renderer (pymupdf) and the handler are loaded on first use
+_eaip_handler = None
+_warm_up_task: Optional[asyncio.Task] = None
+WARM_UP_DELAY = 10
+WARM_UP_MODULES = ["pymupdf"]
+
 eaip_command = on_command("eaip", rule=to_me(), priority=3, block=True)
+driver = get_driver()
+
+
+def get_eaip_handler():
+    """Get the chart handler, creating it on first use"""
+    global _eaip_handler
+    if _eaip_handler is None:
+        from .eaip import EaipHandler
+
+        _eaip_handler = EaipHandler()
+    return _eaip_handler
+
+
+def _warm_up_imports() -> None:
+    """Import heavy modules, runs in a worker thread"""
+    for name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Warm-up import failed: {name}", "eaip", e=e)
+    importlib.import_module(f"{__name__}.eaip")
+
+
+async def _warm_up() -> None:
+    """Load heavy modules in background once the bot is up"""
+    await asyncio.sleep(WARM_UP_DELAY)
+    try:
+        await asyncio.to_thread(_warm_up_imports)
+        get_eaip_handler()
+        logger.info("eAIP warm-up finished", "eaip")
+    except Exception as e:
+        logger.error("eAIP warm-up failed", "eaip", e=e)
+
+
+@driver.on_startup
+async def _schedule_warm_up():
+    """Schedule optional background warm-up"""
+    global _warm_up_task
+    if Config.get_config("eaip", "WARM_UP", True):
+        _warm_up_task = asyncio.create_task(_warm_up())
+
+
+def _pop_option(args: list, names: tuple) -> tuple:
+    """Remove an option and its value from args, return (found, value)"""
+    for i, arg in enumerate(args):
+        if arg in names:
+            value = args[i + 1] if i + 1 < len(args) else None
+            del args[i:i + 2]
+            return True, value
+    return False, None
+
+
+async def _send_chart(bot: Bot, event: GroupMessageEvent, result) -> None:
+    """Send a chart result: text, image bytes, or a PDF file uploaded to the group"""
+    if isinstance(result, Path):
+        try:
+            await bot.call_api(
+                "upload_group_file",
+                group_id=event.group_id,
+                file=str(result.absolute()),
+                name=result.name
+            )
+            return
+        except Exception as e:
+            logger.error("Failed to upload chart PDF", "eaip", e=e)
+            result = "Failed to upload chart PDF"
+
+    await MessageUtils.build_message([
+        At(flag="user", target=str(event.user_id)),
+        Text(result) if isinstance(result, str) else result
+    ]).send(reply_to=True)
 
 @eaip_command.handle()
 async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
     """Handle eAIP command"""
     args = shlex.split(args.extract_plain_text().strip())
+    eaip_handler = get_eaip_handler()
 
     if not args:
         await MessageUtils.build_message([
@@ -116,12 +264,41 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
             ]).send(reply_to=True)
             return
 
-        # Handle chart queries
-        icao = args[0].upper()
+        # Handle chart queries, names and unknown codes are answered with suggestions, never substituted
+        match = eaip_handler.resolve_airport(args[0])
+        if match.icao is None:
+            text = f"Unknown airport: {args[0]}"
+            if match.suggestions:
+                text += "\nDid you mean:\n" + "\n".join(match.suggestions)
+            await MessageUtils.build_message([
+                At(flag="user", target=str(event.user_id)),
+                Text(text)
+            ]).send(reply_to=True)
+            return
+        icao = match.icao
         search_type = None
         filename = None
         show_raw = "--raw" in args
-        args = [arg for arg in args if arg != "--raw"]
+        show_sheet = "--sheet" in args
+        send_pdf = "--pdf" in args
+        args = [arg for arg in args if arg not in ("--raw", "--sheet", "--pdf")]
+
+        has_region, region = _pop_option(args, ("-r", "--region"))
+        has_pages, pages = _pop_option(args, ("-p", "--pages"))
+        options = None
+        if has_region or has_pages or send_pdf:
+            try:
+                options = RenderOptions(
+                    region=parse_region(region or "") if has_region else None,
+                    fmt="pdf" if send_pdf else "png",
+                    pages=parse_pages(pages or "") if has_pages else None
+                )
+            except ValueError as e:
+                await MessageUtils.build_message([
+                    At(flag="user", target=str(event.user_id)),
+                    Text(str(e))
+                ]).send(reply_to=True)
+                return
 
         if len(args) > 1:
             if args[1].startswith("-s"):
@@ -132,11 +309,8 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
                     ]).send(reply_to=True)
                     return
                 doc_id = args[2]
-                result = await eaip_handler.get_chart(icao, doc_id)
-                await MessageUtils.build_message([
-                    At(flag="user", target=str(event.user_id)),
-                    result
-                ]).send(reply_to=True)
+                result = await eaip_handler.get_chart(icao, doc_id, options)
+                await _send_chart(bot, event, result)
                 return
             elif args[1].startswith("-c"):
                 if len(args) <= 2:
@@ -146,11 +320,8 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
                     ]).send(reply_to=True)
                     return
                 code = args[2].upper()
-                result = await eaip_handler.get_chart_by_code(icao, code)
-                await MessageUtils.build_message([
-                    At(flag="user", target=str(event.user_id)),
-                    result
-                ]).send(reply_to=True)
+                result = await eaip_handler.get_chart_by_code(icao, code, options)
+                await _send_chart(bot, event, result)
                 return
             elif args[1].startswith("-f"):
                 if len(args) <= 2:
@@ -164,7 +335,10 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
                 search_type = args[1].upper()
 
         # Get chart list
-        result = await eaip_handler.get_chart_list(icao, search_type, filename=filename)
+        session_id = f"{event.group_id}:{event.user_id}"
+        result = await eaip_handler.get_chart_list(
+            icao, search_type, filename=filename, session_id=session_id
+        )
         if result is None:
             await MessageUtils.build_message([
                 At(flag="user", target=str(event.user_id)),
@@ -172,7 +346,14 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
             ]).send(reply_to=True)
             return
 
-        if show_raw:
+        if show_sheet:
+            # Return as thumbnail contact sheet
+            sheet = await eaip_handler.get_contact_sheet(icao, search_type, filename=filename)
+            await MessageUtils.build_message([
+                At(flag="user", target=str(event.user_id)),
+                sheet
+            ]).send(reply_to=True)
+        elif show_raw:
             # Return as text
             await MessageUtils.build_message([
                 At(flag="user", target=str(event.user_id)),
@@ -197,28 +378,35 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
                     'name': chart_name
                 })
 
-            image = await template_to_pic(
-                template_path=str(
-                    (TEMPLATE_PATH / "aviation" / "eaip").absolute()
-                ),
-                template_name="main.html",
-                templates={
-                    "icao": icao,
-                    "charts": charts
-                },
-                pages={
-                    "viewport": {"width": 1000, "height": 800},
-                    "base_url": f"file://{(TEMPLATE_PATH / 'aviation' / 'eaip').absolute()}"
-                },
-                wait=2
-            )
+            async def _render_list() -> bytes:
+                from nonebot_plugin_htmlrender import template_to_pic
+
+                return await template_to_pic(
+                    template_path=str(
+                        (TEMPLATE_PATH / "aviation" / "eaip").absolute()
+                    ),
+                    template_name="main.html",
+                    templates={
+                        "icao": icao,
+                        "charts": charts
+                    },
+                    pages={
+                        "viewport": {"width": 1000, "height": 800},
+                        "base_url": f"file://{(TEMPLATE_PATH / 'aviation' / 'eaip').absolute()}"
+                    },
+                    wait=2
+                )
+
+            # Identical lists are rendered once and shared with other bot processes
+            image = await eaip_handler.get_list_image(icao, result, _render_list)
 
             await MessageUtils.build_message([
                 At(flag="user", target=str(event.user_id)),
                 image
             ]).send(reply_to=True)
 
-        # Wait for user selection
+        # Render likely picks while waiting for user selection
+        prefetch = eaip_handler.start_prefetch(session_id, options)
         try:
             resp = await prompt_until(
                 "Please enter a number to select a chart within 60 seconds:",
@@ -227,14 +415,15 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
                 retry=1,
                 retry_prompt="Invalid input, please enter a valid number"
             )
+            # Drops only queued prefetches, a running one keeps going and serves the selection
+            eaip_handler.cancel_prefetch(prefetch)
 
             if resp:
                 selection = resp.extract_plain_text().strip()
-                chart = await eaip_handler.get_chart_by_selection(icao, selection)
-                await MessageUtils.build_message([
-                    At(flag="user", target=str(event.user_id)),
-                    chart if chart else Text("Chart not found")
-                ]).send(reply_to=True)
+                chart = await eaip_handler.get_chart_by_selection(session_id, selection, options)
+                if chart and not isinstance(chart, str):
+                    eaip_handler.record_selection(session_id, selection)
+                await _send_chart(bot, event, chart if chart else "Chart not found")
 
         except Exception as e:
             await MessageUtils.build_message([
@@ -242,6 +431,8 @@ async def handle_eaip(bot: Bot, event: GroupMessageEvent, args=CommandArg()):
                 Text("Operation timed out or invalid selection, please query again")
             ]).send(reply_to=True)
             logger.error("Failed to select chart", "eaip", e=e)
+        finally:
+            eaip_handler.cancel_prefetch(prefetch)
 
     except Exception as e:
         await MessageUtils.build_message([
@@ -0,0 +1,708 @@
+"""
+Author: cg8-5712
+Date: 2025-05-02
+Version: 1.0.0
+License: GPL-3.0
+LastEditTime: 2025-07-21 14:30
+Title: eAIP Load Test
+Description: Drives handle_eaip with many concurrent simulated users against a synthetic
+AIRAC cycle, without a bot connection. nonebot, the OneBot adapter, the waiter, alconna,
+htmlrender and zhenxun are replaced by small fakes; the chart handler, index and renderer
+are the real ones. Reports plugin import time, throughput, reply latency percentiles, event
+loop lag, peak memory, the size and color of chart images and their size against plain
+24-bit RGB PNGs, to catch slow startup, event loop blocking, concurrency and output
+regressions before deploy.
+
+Usage:
+    python eaip-loadtest.py --users 50 --iterations 20
+    python eaip-loadtest.py --users 10 --mix list=1,select=4 --data-dir /tmp/eaip-cycle
+    python eaip-loadtest.py --fail-lag-ms 100 --fail-p99-ms 3000 --fail-errors
+    python eaip-loadtest.py --fail-image-kb 2048 --fail-gray --fail-ratio 2.5
+    python eaip-loadtest.py --fail-import-ms 200
+"""
+
+import argparse
+import asyncio
+import contextvars
+import importlib
+import importlib.util
+import json
+import random
+import resource
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PACKAGE_NAME = "eaip_loadtest"
+PERIOD = 2505
+DIR_NAME = "EAIP2025-05.V1.3"
+CHART_TYPES = ["ADC", "SID", "STAR", "IAC", "APDC", "GMC"]
+# Flow name -> default weight in the request mix
+FLOW_WEIGHTS = {
+    "list": 3, "type": 2, "runway": 1, "code": 2, "select": 3, "raw": 1, "pdf": 1,
+    "region": 1, "pages": 1, "sheet": 1
+}
+# Page sizes of synthetic charts in points: A4 portrait, A4 landscape, A3 fold-out
+PAGE_SIZES = [(595, 842), (842, 595), (1191, 1684)]
+REGION_NAMES = ["tl", "tr", "bl", "br", "top", "bottom"]
+A3_POINTS = PAGE_SIZES[2][0] * PAGE_SIZES[2][1]
+LAG_INTERVAL = 0.01
+# Replies that mean the command did not deliver what was asked for
+FAILURE_REPLIES = (
+    "Failed", "Operation timed out", "Unknown airport", "No charts", "Chart file",
+    "Chart with", "Invalid selection", "Selection expired", "PDF extraction failed"
+)
+
+# Simulated user of the current task, read by the fakes
+_current_user: contextvars.ContextVar["SimulatedUser"] = contextvars.ContextVar("user")
+
+
+# ---------------------------------------------------------------- fakes
+
+class FakeMessage:
+    """Plain text message, stands in for the command argument and prompt replies"""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def extract_plain_text(self) -> str:
+        return self.text
+
+
+class FakeBot:
+    """Bot that records API calls instead of sending them"""
+
+    def __init__(self, stats: "LoadStats") -> None:
+        self.stats = stats
+
+    async def call_api(self, api: str, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(0.005)
+        _current_user.get().reply(f"<{api}:{kwargs.get('name')}>")
+        return {}
+
+
+class FakeGroupMessageEvent:
+    def __init__(self, group_id: int, user_id: int) -> None:
+        self.group_id = group_id
+        self.user_id = user_id
+
+
+class FakeSegment:
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.args = args
+        self.kwargs = kwargs
+
+
+class FakeText(FakeSegment):
+    def __init__(self, text: str) -> None:
+        super().__init__(text)
+        self.text = text
+
+
+class FakeOutgoing:
+    def __init__(self, segments: List[Any]) -> None:
+        self.segments = segments
+
+    async def send(self, reply_to: bool = False) -> None:
+        await asyncio.sleep(0.002)
+        texts = [x.text for x in self.segments if isinstance(x, FakeText)]
+        images = [x for x in self.segments if isinstance(x, bytes)]
+        _current_user.get().reply(" ".join(texts) if texts else "<image>", images[0] if images else None)
+
+
+class FakeMessageUtils:
+    @staticmethod
+    def build_message(segments: List[Any]) -> FakeOutgoing:
+        return FakeOutgoing(segments)
+
+
+class FakeConfig:
+    """zhenxun Config backed by a dict"""
+
+    values: Dict[tuple, Any] = {}
+
+    @classmethod
+    def get_config(cls, module: str, key: str, default: Any = None) -> Any:
+        return cls.values.get((module, key), default)
+
+    @classmethod
+    def set_config(cls, module: str, key: str, value: Any, auto_save: bool = False) -> None:
+        cls.values[(module, key)] = value
+
+    @classmethod
+    def add_plugin_config(cls, module: str, key: str, value: Any, **kwargs: Any) -> None:
+        cls.values.setdefault((module, key), value)
+
+
+class FakeLogger:
+    """zhenxun logger that only counts errors"""
+
+    errors = 0
+
+    def info(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    success = debug = warning = info
+
+    def error(self, *args: Any, **kwargs: Any) -> None:
+        FakeLogger.errors += 1
+
+
+class FakeMatcher:
+    def handle(self):
+        return lambda func: func
+
+
+class FakeDriver:
+    def on_startup(self, func):
+        return func
+
+
+class FakePluginExtraData:
+    def __init__(self, **kwargs: Any) -> None:
+        self.kwargs = kwargs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.kwargs
+
+
+async def fake_prompt_until(message: str, checker: Any, timeout: float = 60, **kwargs: Any) -> Optional[FakeMessage]:
+    """Answer the selection prompt like a user would, after some think time"""
+    user = _current_user.get()
+    await asyncio.sleep(random.uniform(*user.harness.think_time))
+    selection = user.pick_selection()
+    # The chart reply is timed from the moment the user answers
+    user.started = time.perf_counter()
+    user.step = "selection"
+    return FakeMessage(selection) if selection else None
+
+
+async def fake_template_to_pic(**kwargs: Any) -> bytes:
+    """Browser screenshot of the list page, approximated by a fixed delay"""
+    await asyncio.sleep(_current_user.get().harness.render_delay)
+    return b"\x89PNG fake list image"
+
+
+def _module(name: str, **attrs: Any) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install_fakes(data_path: Path) -> None:
+    """Register fake framework modules before the plugin is imported"""
+    async def superuser(bot: Any, event: Any) -> bool:
+        return True
+
+    _module("nonebot", on_command=lambda *a, **k: FakeMatcher(), require=lambda name: None,
+            get_driver=FakeDriver)
+    _module("nonebot.plugin", PluginMetadata=FakeSegment)
+    _module("nonebot.params", CommandArg=lambda: None)
+    _module("nonebot.rule", to_me=lambda: None)
+    _module("nonebot.permission", SUPERUSER=superuser)
+    _module("nonebot.adapters", Bot=FakeBot)
+    _module("nonebot.adapters.onebot")
+    _module("nonebot.adapters.onebot.v11", GroupMessageEvent=FakeGroupMessageEvent)
+    _module("nonebot_plugin_waiter", prompt_until=fake_prompt_until)
+    _module("nonebot_plugin_alconna", At=FakeSegment, Text=FakeText)
+    _module("nonebot_plugin_htmlrender", template_to_pic=fake_template_to_pic)
+    _module("zhenxun")
+    _module("zhenxun.configs")
+    _module("zhenxun.configs.path_config", PLUGIN_DATA_PATH=data_path, TEMPLATE_PATH=data_path / "template")
+    _module("zhenxun.configs.config", Config=FakeConfig)
+    _module("zhenxun.configs.utils", PluginExtraData=FakePluginExtraData, RegisterConfig=FakeSegment)
+    _module("zhenxun.utils")
+    _module("zhenxun.utils.message", MessageUtils=FakeMessageUtils)
+    _module("zhenxun.services")
+    _module("zhenxun.services.log", logger=FakeLogger())
+
+
+def load_plugin(data_path: Path) -> types.ModuleType:
+    """Import the plugin package with the fakes in place"""
+    install_fakes(data_path)
+    FakeConfig.set_config("eaip", "AIRAC_PERIOD", PERIOD)
+    FakeConfig.set_config("eaip", "DIR_NAME", DIR_NAME)
+    FakeConfig.set_config("eaip", "WARM_UP", False)
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, Path(__file__).resolve().parent / "__init__.py",
+        submodule_search_locations=[str(Path(__file__).resolve().parent)]
+    )
+    plugin = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = plugin
+    spec.loader.exec_module(plugin)
+    return plugin
+
+
+# Modules the plugin must not import while it is loaded, they are loaded on first use
+DEFERRED_MODULES = ("pymupdf", "PIL")
+
+
+def measure_import(data_path: Path) -> tuple:
+    """Load the plugin, returning it with the import time in seconds and any deferred
+    modules the import pulled in"""
+    loaded = {x for x in DEFERRED_MODULES if x in sys.modules}
+    started = time.perf_counter()
+    plugin = load_plugin(data_path)
+    elapsed = time.perf_counter() - started
+    eager = [x for x in DEFERRED_MODULES if x in sys.modules and x not in loaded]
+    return plugin, elapsed, eager
+
+
+# ---------------------------------------------------------------- synthetic cycle
+
+def _draw_chart(page: Any, rng: random.Random, title: str) -> None:
+    """Vector content roughly as dense as a real chart"""
+    width, height = page.rect.width, page.rect.height
+    page.insert_text((30, 40), title, fontsize=14)
+    for _ in range(400):
+        page.draw_line(
+            (rng.uniform(0, width), rng.uniform(0, height)),
+            (rng.uniform(0, width), rng.uniform(0, height)),
+            color=(0, 0, 0) if rng.random() < 0.8 else (0.1, 0.3, 0.8),
+            width=rng.uniform(0.2, 1.5)
+        )
+    for _ in range(80):
+        page.insert_text(
+            (rng.uniform(20, width - 80), rng.uniform(60, height - 20)),
+            f"{rng.choice('ABCDEFGHKLMNPRSTUVWXYZ')}{rng.randint(100, 999)}",
+            fontsize=rng.choice([6, 7, 8])
+        )
+
+
+def build_cycle(data_path: Path, plugin: types.ModuleType, airports: int, charts: int, seed: int) -> None:
+    """Write a synthetic cycle of vector chart PDFs and index it"""
+    import pymupdf
+
+    base_path = data_path / "AD" / str(PERIOD)
+    terminal = base_path / "Data" / DIR_NAME / "Terminal"
+    if terminal.exists() and any(terminal.glob("*/index.json")):
+        print(f"Reusing synthetic cycle in {base_path}", file=sys.stderr)
+        return
+
+    rng = random.Random(seed)
+    ad_entries = []
+    for a in range(airports):
+        icao = f"Z{chr(65 + a // 26 % 26)}{chr(65 + a % 26)}{chr(65 + rng.randrange(26))}"
+        for n in range(charts):
+            chart_type = CHART_TYPES[n % len(CHART_TYPES)]
+            runway = f"{rng.randint(1, 36):02d}{rng.choice(['', 'L', 'R'])}"
+            name = f"{icao}-{n // len(CHART_TYPES) + 1}{chr(65 + n % 3)}-{chart_type} RWY{runway}"
+            folder = terminal / icao / chart_type
+            folder.mkdir(parents=True, exist_ok=True)
+            doc = pymupdf.open()
+            for page in range(1 if rng.random() < 0.8 else 3):
+                # Every airport has an A3 chart, so banded renders are always exercised
+                width, height = PAGE_SIZES[2] if n == page == 0 else rng.choices(PAGE_SIZES, weights=[8, 1, 1])[0]
+                _draw_chart(doc.new_page(width=width, height=height), rng, name)
+            doc.save(str(folder / f"{name}.pdf"), deflate=True)
+            doc.close()
+            ad_entries.append({
+                "name": name,
+                "pdfPath": f"/Data/{DIR_NAME}/Terminal/{icao}/{chart_type}/{name}.pdf",
+                "airportName": f"Synthetic {icao[1:]}",
+            })
+
+    json_path = base_path / "Data" / "JsonPath" / "AD.JSON"
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    json_path.write_text(json.dumps(ad_entries), encoding="utf-8")
+
+    eaip_init = importlib.import_module(f"{PACKAGE_NAME}.eaip_init")
+    eaip_init.ChartProcessor(base_path, dir_name=DIR_NAME).update(["index"])
+    print(f"Synthetic cycle: {airports} airports x {charts} charts in {base_path}", file=sys.stderr)
+
+
+def load_catalog(data_path: Path) -> Dict[str, List[Dict[str, Any]]]:
+    """ICAO -> index entries, used to build realistic queries"""
+    terminal = data_path / "AD" / str(PERIOD) / "Data" / DIR_NAME / "Terminal"
+    catalog = {}
+    for index_path in sorted(terminal.glob("*/index.json")):
+        catalog[index_path.parent.name] = json.loads(index_path.read_text(encoding="utf-8"))
+    return catalog
+
+
+# ---------------------------------------------------------------- load generation
+
+class LoadStats:
+    def __init__(self) -> None:
+        # Step name -> reply latencies in seconds
+        self.latencies: Dict[str, List[float]] = {}
+        self.commands = 0
+        self.failed_replies = 0
+        self.lags: List[float] = []
+        self.peak_rss_kb = 0
+        # Step name -> sizes of the chart images sent
+        self.payloads: Dict[str, List[int]] = {}
+        # Chart images without color; every synthetic chart has blue lines
+        self.gray_charts = 0
+
+
+def png_is_gray(data: bytes) -> Optional[bool]:
+    """Whether a PNG holds no color, from its header and palette; None if not a PNG"""
+    if not data.startswith(b"\x89PNG\r\n\x1a\n") or len(data) < 33:
+        return None
+    color_type = data[25]
+    if color_type in (0, 4):
+        return True
+    if color_type != 3:
+        return False
+    pos = 8
+    while pos + 8 <= len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        if tag == b"PLTE":
+            palette = data[pos + 8:pos + 8 + length]
+            return all(
+                max(palette[i:i + 3]) - min(palette[i:i + 3]) <= 8 for i in range(0, len(palette), 3)
+            )
+        pos += length + 12
+    return None
+
+
+class SimulatedUser:
+    """One chat user issuing a mix of eaip commands"""
+
+    def __init__(self, harness: "LoadTest", index: int) -> None:
+        self.harness = harness
+        self.event = FakeGroupMessageEvent(group_id=1000 + index % 10, user_id=index)
+        self.rng = random.Random(harness.seed + index)
+        self.started = 0.0
+        self.step = ""
+
+    def reply(self, text: str, image: Optional[bytes] = None) -> None:
+        """Record the latency of a reply of the current step, and its image"""
+        stats = self.harness.stats
+        stats.latencies.setdefault(self.step, []).append(time.perf_counter() - self.started)
+        if text.startswith(FAILURE_REPLIES):
+            stats.failed_replies += 1
+        gray = png_is_gray(image) if image else None
+        if gray is not None:
+            stats.payloads.setdefault(self.step, []).append(len(image))
+            stats.gray_charts += gray
+
+    def pick_selection(self) -> Optional[str]:
+        """Pick a chart number from the list the handler keeps for this user"""
+        handler = self.harness.plugin.get_eaip_handler()
+        session = handler._sessions.get(f"{self.event.group_id}:{self.event.user_id}")
+        if session is None:
+            return None
+        return self.rng.choice(sorted(session.charts))
+
+    def next_command(self) -> tuple:
+        """Pick a flow and build its command text"""
+        catalog = self.harness.catalog
+        flows, weights = zip(*self.harness.mix.items())
+        flow = self.rng.choices(flows, weights=weights)[0]
+        icao = self.rng.choice(list(catalog))
+        chart = self.rng.choice(catalog[icao])
+        pages = chart.get("pages") or 1
+        first_page = self.rng.randint(1, pages)
+        runways = [x for entry in catalog[icao] for x in entry.get("runways", [])] or ["01"]
+        commands = {
+            "list": f"{icao}",
+            "type": f"{icao} {chart['sort']}",
+            "runway": f"{icao} {self.rng.choice(runways)}",
+            "code": f"{icao} -c {chart['code']}",
+            "select": f"{icao} -s {chart['id']}",
+            "raw": f"{icao} --raw",
+            "pdf": f"{icao} -s {chart['id']} --pdf",
+            "region": f"{icao} -s {chart['id']} -r {self.rng.choice(REGION_NAMES)}",
+            "pages": f"{icao} -s {chart['id']} -p {first_page}-{self.rng.randint(first_page, pages)}",
+            "sheet": f"{icao} {chart['sort']} --sheet",
+        }
+        return flow, commands[flow]
+
+    async def _issue(self, bot: FakeBot, flow: str, text: str) -> None:
+        self.step = flow
+        self.started = time.perf_counter()
+        await self.harness.plugin.handle_eaip(bot, self.event, FakeMessage(text))
+        self.harness.stats.commands += 1
+
+    async def run(self, iterations: int) -> None:
+        _current_user.set(self)
+        bot = FakeBot(self.harness.stats)
+        # Large charts are queried whatever the seed and mix, shared out among the users
+        while self.harness.large_charts:
+            await self._issue(bot, "large", self.harness.large_charts.pop())
+        for _ in range(iterations):
+            await self._issue(bot, *self.next_command())
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, plugin: types.ModuleType,
+                 catalog: Dict[str, List[Dict[str, Any]]]) -> None:
+        self.plugin = plugin
+        self.catalog = catalog
+        self.seed = args.seed
+        self.mix = args.mix
+        self.think_time = args.think_ms[0] / 1000, args.think_ms[1] / 1000
+        self.render_delay = args.list_render_ms / 1000
+        self.users = args.users
+        self.iterations = args.iterations
+        self.stats = LoadStats()
+        # One A3 chart of every airport that has one, rendered in bands
+        self.large_charts = [
+            f"{icao} -s {large[0]['id']}"
+            for icao, entries in catalog.items()
+            for large in [[x for x in entries if x.get("width", 0) * x.get("height", 0) >= A3_POINTS]]
+            if large
+        ]
+
+    async def _monitor(self, stop: asyncio.Event) -> None:
+        """Measure event loop lag and resident memory"""
+        while not stop.is_set():
+            expected = time.perf_counter() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            self.stats.lags.append(max(0.0, time.perf_counter() - expected))
+            self.stats.peak_rss_kb = max(self.stats.peak_rss_kb, current_rss_kb())
+
+    async def run(self) -> float:
+        FakeLogger.errors = 0
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self._monitor(stop))
+        started = time.perf_counter()
+        users = [SimulatedUser(self, i) for i in range(self.users)]
+        await asyncio.gather(*(asyncio.create_task(x.run(self.iterations)) for x in users))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        return elapsed
+
+
+def current_rss_kb() -> int:
+    """Resident memory of this process, falls back to the peak where /proc is missing"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def measure_compression(data_path: Path, catalog: Dict[str, List[Dict[str, Any]]],
+                        samples: int, seed: int) -> Dict[str, Any]:
+    """Render sample charts with the plugin and as plain 24-bit RGB PNG at the same size
+
+    Runs after the load, so it does not compete with the simulated users.
+    """
+    if samples <= 0:
+        return {}
+    import pymupdf
+
+    render = importlib.import_module(f"{PACKAGE_NAME}.eaip_render")
+    terminal = data_path / "AD" / str(PERIOD) / "Data" / DIR_NAME / "Terminal"
+    rng = random.Random(seed)
+    # The first chart of every airport, then random ones
+    charts = [(icao, entries[0]) for icao, entries in catalog.items() if entries]
+    charts += [(icao, rng.choice(entries)) for icao, entries in catalog.items() if entries]
+    ratios, sizes, baseline_sizes, times, baseline_times = [], [], [], [], []
+    for icao, entry in charts[:samples]:
+        path = terminal / icao / entry["path"]
+        options = render.RenderOptions()
+        started = time.perf_counter()
+        png = render.render_page(path, options)
+        times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with pymupdf.open(str(path)) as doc:
+            page = doc[0]
+            clip, zoom = render._plan_render(page.rect, options)
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), clip=clip, colorspace="rgb", alpha=False)
+            baseline = pix.tobytes("png")
+        baseline_times.append(time.perf_counter() - started)
+        sizes.append(len(png))
+        baseline_sizes.append(len(baseline))
+        ratios.append(len(baseline) / len(png))
+
+    return {
+        "charts": len(ratios),
+        "ratio_p50": round(percentile(ratios, 0.5), 2),
+        "ratio_min": round(min(ratios), 2),
+        "image_kb_p50": round(percentile(sizes, 0.5) / 1024, 1),
+        "rgb_kb_p50": round(percentile(baseline_sizes, 0.5) / 1024, 1),
+        "render_ms_p50": round(percentile(times, 0.5) * 1000, 1),
+        "rgb_render_ms_p50": round(percentile(baseline_times, 0.5) * 1000, 1),
+    }
+
+
+def report(test: LoadTest, elapsed: float, import_s: float, eager: List[str],
+           compression: Dict[str, Any]) -> Dict[str, Any]:
+    stats = test.stats
+    all_latencies = [x for values in stats.latencies.values() for x in values]
+    result = {
+        "import_ms": round(import_s * 1000, 1),
+        "eager_imports": eager,
+        "users": test.users,
+        "commands": stats.commands,
+        "elapsed_s": round(elapsed, 2),
+        "commands_per_s": round(stats.commands / elapsed, 2) if elapsed else 0.0,
+        "replies": len(all_latencies),
+        "failed_replies": stats.failed_replies,
+        "logged_errors": FakeLogger.errors,
+        "latency_ms": {
+            step: {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5) * 1000, 1),
+                "p99": round(percentile(values, 0.99) * 1000, 1),
+                "max": round(max(values) * 1000, 1),
+            }
+            for step, values in sorted(stats.latencies.items())
+        },
+        "p50_ms": round(percentile(all_latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(all_latencies, 0.99) * 1000, 1),
+        "loop_lag_ms": {
+            "p50": round(percentile(stats.lags, 0.5) * 1000, 1),
+            "p99": round(percentile(stats.lags, 0.99) * 1000, 1),
+            "max": round(max(stats.lags, default=0.0) * 1000, 1),
+        },
+        "peak_rss_mb": round(max(stats.peak_rss_kb, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) / 1024, 1),
+        "image_kb": {
+            step: {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5) / 1024, 1),
+                "max": round(max(values) / 1024, 1),
+            }
+            for step, values in sorted(stats.payloads.items())
+        },
+        "gray_charts": stats.gray_charts,
+        "compression": compression,
+    }
+
+    print(f"Plugin import: {result['import_ms']} ms"
+          + (f", eagerly imported {', '.join(eager)}" if eager else ""))
+    print(f"Users: {result['users']}  Commands: {result['commands']} in {result['elapsed_s']}s "
+          f"({result['commands_per_s']}/s)")
+    print(f"Replies: {result['replies']}  Failed replies: {result['failed_replies']}  "
+          f"Logged errors: {result['logged_errors']}")
+    print(f"{'step':<10}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, values in result["latency_ms"].items():
+        print(f"{step:<10}{values['count']:>8}{values['p50']:>10}{values['p99']:>10}{values['max']:>10}")
+    print(f"All replies: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+    lag = result["loop_lag_ms"]
+    print(f"Event loop lag: p50 {lag['p50']} ms, p99 {lag['p99']} ms, max {lag['max']} ms")
+    print(f"Peak RSS: {result['peak_rss_mb']} MB")
+    for step, values in result["image_kb"].items():
+        print(f"Chart images of {step}: {values['count']}, p50 {values['p50']} KB, max {values['max']} KB")
+    print(f"Chart images without color: {result['gray_charts']}")
+    if compression:
+        print(f"Against 24-bit RGB PNG ({compression['charts']} charts): {compression['ratio_p50']}x smaller "
+              f"(min {compression['ratio_min']}x), p50 {compression['image_kb_p50']} KB vs "
+              f"{compression['rgb_kb_p50']} KB, render p50 {compression['render_ms_p50']} ms vs "
+              f"{compression['rgb_render_ms_p50']} ms")
+    return result
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "list=3,select=1" into flow weights"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in FLOW_WEIGHTS:
+            raise argparse.ArgumentTypeError(f"Unknown flow: {name} (choose from {', '.join(FLOW_WEIGHTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_range(value: str) -> tuple:
+    low, _, high = value.partition(",")
+    return float(low), float(high or low)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the eaip command with simulated users")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users (default: 20)")
+    parser.add_argument("--iterations", type=int, default=10, help="commands per user (default: 10)")
+    parser.add_argument("--mix", type=parse_mix, default=dict(FLOW_WEIGHTS),
+                        help=f"flow weights, e.g. list=3,select=1 (flows: {', '.join(FLOW_WEIGHTS)})")
+    parser.add_argument("--airports", type=int, default=12, help="airports in the synthetic cycle")
+    parser.add_argument("--charts", type=int, default=30, help="charts per airport")
+    parser.add_argument("--data-dir", type=Path,
+                        help="plugin data directory, reused when it already holds a cycle (default: temporary)")
+    parser.add_argument("--think-ms", type=parse_range, default=(50, 300),
+                        help="user think time before answering the prompt, min,max (default: 50,300)")
+    parser.add_argument("--list-render-ms", type=float, default=150,
+                        help="simulated htmlrender time for list images (default: 150)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="also write the report as JSON")
+    parser.add_argument("--fail-lag-ms", type=float, help="exit with status 1 if p99 event loop lag exceeds this")
+    parser.add_argument("--fail-p99-ms", type=float, help="exit with status 1 if p99 reply latency exceeds this")
+    parser.add_argument("--fail-import-ms", type=float,
+                        help="exit with status 1 if importing the plugin takes longer than this "
+                             "or imports the renderer")
+    parser.add_argument("--fail-errors", action="store_true",
+                        help="exit with status 1 if any reply failed or an error was logged")
+    parser.add_argument("--fail-image-kb", type=float, help="exit with status 1 if any chart image exceeds this")
+    parser.add_argument("--fail-gray", action="store_true",
+                        help="exit with status 1 if a chart image lost its color")
+    parser.add_argument("--compression-samples", type=int, default=8,
+                        help="charts rendered after the load to compare against 24-bit RGB PNG, 0 to skip "
+                             "(default: 8)")
+    parser.add_argument("--fail-ratio", type=float,
+                        help="exit with status 1 if chart PNGs are not this many times smaller than 24-bit RGB "
+                             "(median)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    temporary = args.data_dir is None
+    data_path = Path(tempfile.mkdtemp(prefix="eaip-load-")) if temporary else args.data_dir
+    random.seed(args.seed)
+    try:
+        plugin, import_s, eager = measure_import(data_path)
+        build_cycle(data_path, plugin, args.airports, args.charts, args.seed)
+        catalog = load_catalog(data_path)
+        if not catalog:
+            print("Synthetic cycle has no indexed airports", file=sys.stderr)
+            return 2
+
+        test = LoadTest(args, plugin, catalog)
+        elapsed = asyncio.run(test.run())
+        compression = measure_compression(data_path, catalog, args.compression_samples, args.seed)
+        result = report(test, elapsed, import_s, eager, compression)
+        if args.json:
+            args.json.write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+        failed = False
+        if args.fail_import_ms is not None and (result["import_ms"] > args.fail_import_ms or eager):
+            print(f"FAIL: plugin import above {args.fail_import_ms} ms or not deferring "
+                  f"{', '.join(DEFERRED_MODULES)}", file=sys.stderr)
+            failed = True
+        if args.fail_lag_ms is not None and result["loop_lag_ms"]["p99"] > args.fail_lag_ms:
+            print(f"FAIL: p99 event loop lag above {args.fail_lag_ms} ms", file=sys.stderr)
+            failed = True
+        if args.fail_p99_ms is not None and result["p99_ms"] > args.fail_p99_ms:
+            print(f"FAIL: p99 reply latency above {args.fail_p99_ms} ms", file=sys.stderr)
+            failed = True
+        if args.fail_errors and (result["failed_replies"] or result["logged_errors"]):
+            print(f"FAIL: {result['failed_replies']} failed replies, {result['logged_errors']} logged errors",
+                  file=sys.stderr)
+            failed = True
+        largest = max((x["max"] for x in result["image_kb"].values()), default=0.0)
+        if args.fail_image_kb is not None and largest > args.fail_image_kb:
+            print(f"FAIL: chart image above {args.fail_image_kb} KB", file=sys.stderr)
+            failed = True
+        if args.fail_gray and result["gray_charts"]:
+            print(f"FAIL: {result['gray_charts']} chart images lost their color", file=sys.stderr)
+            failed = True
+        if args.fail_ratio is not None and compression and compression["ratio_p50"] < args.fail_ratio:
+            print(f"FAIL: chart images less than {args.fail_ratio}x smaller than 24-bit RGB", file=sys.stderr)
+            failed = True
+        return 1 if failed else 0
+    finally:
+        if temporary:
+            shutil.rmtree(data_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
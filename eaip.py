@@ -3,7 +3,7 @@ Author: cg8-5712
 Date: 2025-05-02
 Version: 1.8.0
 License: GPL-3.0
-LastEditTime: 2025-07-02 21:55
+LastEditTime: 2025-07-21 16:05
 Title: eAIP Chart Query Plugin
 Description: Core handler for processing eAIP chart data. This module provides functionality
 for managing and retrieving aeronautical charts, including AIRAC cycle updates,
@@ -12,16 +12,48 @@ chart listing, and PDF to image conversion.
 
 import os
 import json
+import hashlib
 import re
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Union, List, Dict, Optional
-import pymupdf
+from typing import Awaitable, Callable, Union, List, Dict, Optional, Tuple
 from zhenxun.services.log import logger
 from zhenxun.configs.path_config import PLUGIN_DATA_PATH
 from zhenxun.configs.config import Config
-from .eaip_init import ChartProcessor
+from .eaip_airports import AirportDirectory, AirportMatch
+from .eaip_airport_names import AIRPORT_NAMES
+from .eaip_cache import CacheBackend, LRUCache, SelectionStats, create_cache_backend
+from .eaip_index import AirportIndex, ChartRecord
+from .eaip_archive import ArchiveMember, ReleaseArchive, find_release_archive
+from .eaip_render import (
+    ChartSource, DisplayListCache, RenderOptions, render_page, render_contact_sheet, extract_pages, read_source,
+    planned_pixels, BAND_PIXELS, MAX_SHEET_CHARTS
+)
 
 EAIP_DATA_PATH = PLUGIN_DATA_PATH / "AD"
+RUNWAY_QUERY_PATTERN = re.compile(r"^(?:RWY)?((?:0[1-9]|[12]\d|3[0-6])[LRC]?)$")
+RENDER_CACHE_BYTES = 128 * 1024 * 1024
+# List results are kept per user long enough to answer the selection prompt
+SESSION_TTL = 180
+SESSION_MAX = 1024
+# Bumped when rendering changes, so other processes do not serve stale shared images
+SHARED_CACHE_VERSION = 2
+# Banded renders of large charts running at once, each holds a parsed page, a
+# preview and a band, and takes seconds of CPU
+LARGE_RENDER_SLOTS = 2
+
+RenderKey = Tuple[str, Optional[RenderOptions]]
+
+
+@dataclass(slots=True)
+class ListSession:
+    """Filtered chart list last shown to a user"""
+    icao: str
+    filter_key: str
+    airport_path: Path
+    charts: Dict[str, ChartRecord]
 
 class EaipHandler:
     def __init__(self):
@@ -30,24 +62,56 @@ class EaipHandler:
         self.dir_name = Config.get_config("eaip", "DIR_NAME", "EAIP2025-05.V1.3")
         # Build base_path using EAIP_DATA_PATH and current cycle
         self.base_path = EAIP_DATA_PATH / str(self.airac)
+        # Airport codes and names of the current cycle, built on first query
+        self._airports: Optional[AirportDirectory] = None
+        # Loaded airport indexes of the current cycle, keyed by ICAO
+        self._indexes: Dict[str, AirportIndex] = {}
+        # Opened release archives of the current cycle, for archive-backed indexes
+        self._archives: Dict[str, ReleaseArchive] = {}
+        # Rendered charts and renders still in progress, keyed by (chart source, options)
+        self._render_cache = LRUCache(max_items=256, max_bytes=RENDER_CACHE_BYTES)
+        self._pending: Dict[RenderKey, asyncio.Future] = {}
+        self._large_renders = asyncio.Semaphore(LARGE_RENDER_SLOTS)
+        # Rendered charts and list images shared with other bot processes
+        self.shared_cache = self._create_shared_cache()
+        # Parsed pages of hot charts, reused for renders at any zoom or clip
+        self._display_lists = DisplayListCache()
+        # Speculative renders run on a single worker so they never compete
+        # with more than one core against user requests
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eaip-prefetch")
+        self.selection_stats = SelectionStats(EAIP_DATA_PATH / "selection_stats.json")
+        # Last list shown to each user, keyed by session id
+        self._sessions = LRUCache(max_items=SESSION_MAX, ttl=SESSION_TTL)
 
     async def update_dir_name(self) -> str:
         """Auto update DIR_NAME based on EAIP folder"""
         try:
             target_path = EAIP_DATA_PATH / str(self.airac) / "Data"
-            if not target_path.exists():
-                print(f"Directory {target_path} does not exist")
-                return f"Directory {target_path} does not exist"
-
-            # Find EAIP folder
-            eaip_dirs = [d for d in target_path.iterdir() if d.is_dir() and d.name.startswith("EAIP")]
-            print(f"EAIP folders found: {eaip_dirs}")
-            if not eaip_dirs:
+            dir_name = None
+            if target_path.exists():
+                # Find EAIP folder
+                eaip_dirs = [d for d in target_path.iterdir() if d.is_dir() and d.name.startswith("EAIP")]
+                print(f"EAIP folders found: {eaip_dirs}")
+                if eaip_dirs:
+                    dir_name = eaip_dirs[0].name
+
+            if dir_name is None:
+                # Not extracted, take the folder name from the release archive
+                archive_path = find_release_archive(target_path.parent)
+                if archive_path is not None:
+                    archive = ReleaseArchive(archive_path)
+                    dir_name = archive.eaip_dir_name()
+                    archive.close()
+
+            if dir_name is None:
+                if not target_path.exists():
+                    print(f"Directory {target_path} does not exist")
+                    return f"Directory {target_path} does not exist"
                 print(f"No EAIP folder found in {target_path}")
                 return f"No EAIP folder found in {target_path}"
 
             # Update DIR_NAME
-            self.dir_name = eaip_dirs[0].name
+            self.dir_name = dir_name
             Config.set_config("eaip", "DIR_NAME", self.dir_name, True)
             logger.info(f"DIR_NAME updated to: {self.dir_name}", "eaip")
             return f"DIR_NAME update successful: {self.dir_name}"
@@ -75,25 +139,56 @@ class EaipHandler:
             if not new_path.exists():
                 return f"Data directory {new_path} does not exist"
 
+            if new_path != self.base_path and self.shared_cache is not None:
+                # Images of the previous cycle are never requested again
+                self.shared_cache.clear()
             self.base_path = new_path
+            self.shared_cache = self._create_shared_cache()
+            self._airports = None
+            self._indexes.clear()
+            self._render_cache.clear()
+            self._display_lists.clear()
+            self._sessions.clear()
+            self._close_archives()
             terminal_path = self.base_path / "Data" / self.dir_name / "Terminal"
             need_update = False
+            archive_path = None
 
             if not terminal_path.exists():
-                return f"Terminal directory not found: {terminal_path}"
-
-            # Check if index files need update
-            for file in os.listdir(terminal_path):
-                file_path = terminal_path / file
-                if file_path.is_dir():
-                    index_path = file_path / "index.json"
-                    if not index_path.exists():
-                        need_update = True
-                        break
+                # Serve charts from the release archive without extracting it
+                archive_path = find_release_archive(self.base_path)
+                if archive_path is None:
+                    return f"Terminal directory not found: {terminal_path}"
+                need_update = True
+            else:
+                # Check if index files need update
+                for file in os.listdir(terminal_path):
+                    file_path = terminal_path / file
+                    if file_path.is_dir():
+                        index_path = file_path / "index.json"
+                        if not index_path.exists():
+                            need_update = True
+                            break
 
             if need_update:
-                processor = ChartProcessor(self.base_path)
-                processor.update(["rename", "organize", "index"])
+                from .eaip_init import ChartProcessor
+
+                # Indexing opens every PDF, keep the event loop responsive meanwhile
+                if archive_path is not None:
+                    with ChartProcessor(self.base_path, archive=archive_path) as processor:
+                        ok = await asyncio.to_thread(processor.update, ["archive"])
+                else:
+                    with ChartProcessor(self.base_path) as processor:
+                        # Single process: worker processes would re-import the plugin package,
+                        # use the offline CLI (eaip-init-single.py --workers) for parallel imports
+                        ok = await asyncio.to_thread(processor.update, ["rename", "organize", "index"])
+                if not ok:
+                    logger.warning("Chart import incomplete, run the update again to retry", "eaip")
+                if processor.invalid_files:
+                    logger.warning(f"{len(processor.invalid_files)} corrupt chart files", "eaip",
+                                   param={"files": processor.invalid_files[:20]})
+                self._airports = None
+                self._indexes.clear()
             else:
                 logger.info("All airport index files exist, no update needed", "eaip")
 
@@ -127,157 +222,441 @@ class EaipHandler:
             logger.error("Failed to update period", "eaip", e=e)
             return f"Update failed: {e}"
 
+    def _create_shared_cache(self) -> Optional[CacheBackend]:
+        """Create the shared render cache of the current cycle, None when disabled"""
+        try:
+            return create_cache_backend(
+                Config.get_config("eaip", "SHARED_CACHE", ""),
+                self.base_path / "Cache" / "shared",
+                Config.get_config("eaip", "SHARED_CACHE_MB", 512) * 1024 * 1024
+            )
+        except Exception as e:
+            logger.warning("Shared render cache disabled", "eaip", e=e)
+            return None
+
+    def _source_id(self, source: ChartSource) -> str:
+        """Name a chart source the same way in every process sharing the cycle data
+
+        The file size and modification time are included, so re-imported charts are not
+        served from images of the old files.
+        """
+        if isinstance(source, ArchiveMember):
+            source_id, file = f"{source.archive.path.name}!{source.name}", source.archive.path
+        elif isinstance(source, Path):
+            try:
+                source_id = source.relative_to(self.base_path).as_posix()
+            except ValueError:
+                source_id = str(source)
+            file = source
+        else:
+            return str(source)
+        stat = file.stat()
+        return f"{source_id}@{stat.st_size}-{stat.st_mtime_ns}"
+
+    def _render(self, source: ChartSource, options: Optional[RenderOptions]) -> bytes:
+        """Render a chart through the shared cache, runs in a worker thread
+
+        Only one process renders a given chart, the others wait and read its result.
+        """
+        def _create() -> bytes:
+            return render_page(source, options, self._display_lists)
+
+        if self.shared_cache is None:
+            return _create()
+        key = f"render|{SHARED_CACHE_VERSION}|{self._source_id(source)}|{options!r}"
+        return self.shared_cache.get_or_create(key, _create)
+
+    async def get_list_image(self, icao: str, listing: str,
+                             render: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Get the list image of a chart list, rendering it with render when no process has yet"""
+        if self.shared_cache is None:
+            return await render()
+
+        digest = hashlib.sha1(listing.encode("utf-8")).hexdigest()
+        key = f"list|{SHARED_CACHE_VERSION}|{icao}|{digest}"
+        loop = asyncio.get_running_loop()
+        try:
+            image = await loop.run_in_executor(None, self.shared_cache.get, key)
+            if image is not None:
+                return image
+        except Exception as e:
+            logger.warning("Failed to read shared list image", "eaip", e=e)
+
+        # The browser render is async, so list images are not locked across processes;
+        # a duplicate render only costs time and the last write wins
+        image = await render()
+        try:
+            await loop.run_in_executor(None, self.shared_cache.set, key, image)
+        except Exception as e:
+            logger.warning("Failed to store shared list image", "eaip", e=e)
+        return image
+
+    def get_airports(self) -> AirportDirectory:
+        """Get the airport directory of the current cycle, built from the Terminal directory
+        and the airport name table"""
+        if self._airports is not None:
+            return self._airports
+
+        terminal_path = self.base_path / "Data" / self.dir_name / "Terminal"
+        icaos = [d.name for d in terminal_path.iterdir() if d.is_dir()] if terminal_path.exists() else []
+        airports = AirportDirectory(icaos, AIRPORT_NAMES)
+        logger.info(f"Airport directory built: {len(airports)} airports", "eaip")
+        # An empty cycle is not kept, so charts copied in later are picked up
+        if len(airports):
+            self._airports = airports
+        return airports
+
+    def resolve_airport(self, query: str) -> AirportMatch:
+        """Resolve an ICAO code of the cycle, with suggestions for names, prefixes and mistyped codes"""
+        try:
+            return self.get_airports().resolve(query)
+        except Exception as e:
+            logger.error("Failed to resolve airport", "eaip", e=e)
+            return AirportMatch(icao=query.strip().upper())
+
+    def _airport_path(self, icao: str) -> Path:
+        """Get airport directory of the current cycle"""
+        return self.base_path / "Data" / self.dir_name / "Terminal" / icao
+
+    def _get_index(self, icao: str) -> Optional[AirportIndex]:
+        """Get airport index, loading index.json on first use"""
+        index = self._indexes.get(icao)
+        if index is None:
+            if icao not in self.get_airports():
+                return None
+            index_path = self._airport_path(icao) / "index.json"
+            if not index_path.exists():
+                return None
+            index = AirportIndex.load(index_path)
+            self._indexes[icao] = index
+        return index
+
+    def _chart_source(self, airport_path: Path, chart: ChartRecord) -> ChartSource:
+        """Get the PDF of a chart, either a file or a release archive member"""
+        if not chart.archive:
+            return airport_path / chart.path
+        archive = self._archives.get(chart.archive)
+        if archive is None:
+            archive = ReleaseArchive(self.base_path / chart.archive)
+            self._archives[chart.archive] = archive
+        return ArchiveMember(archive, chart.path)
+
+    def _close_archives(self) -> None:
+        """Close release archives of the previous cycle"""
+        for archive in self._archives.values():
+            archive.close()
+        self._archives.clear()
+
+    def _missing_index_message(self, icao: str) -> str:
+        """Explain why an airport index could not be loaded"""
+        if icao not in self.get_airports():
+            return f"No charts found for airport {icao}"
+        return "Index file not found"
+
+    def _find_charts(self, icao: str, search_type: str = None,
+                     code: str = None, filename: str = None) -> Optional[List[ChartRecord]]:
+        """Load the airport index and apply the list filters"""
+        index = self._get_index(icao)
+        if index is None:
+            return None
+
+        if code:
+            # Match by code
+            data = index.with_code(code)
+        elif filename:
+            # Search by filename
+            data = index.search_name(filename)
+        elif search_type:
+            runway = RUNWAY_QUERY_PATTERN.match(search_type)
+            if runway:  # Runway number
+                data = index.with_runway(runway.group(1))
+            else:  # Chart type
+                data = index.with_sort(search_type)
+        else:
+            data = index.charts
+
+        return data or None
+
     async def get_chart_list(self, icao: str, search_type: str = None,
-                          code: str = None, filename: str = None) -> Optional[str]:
-        """Get chart list"""
+                          code: str = None, filename: str = None,
+                          session_id: str = None) -> Optional[str]:
+        """Get chart list
+
+        With session_id, the listed charts are kept so that a following
+        selection resolves against exactly this list.
+        """
         try:
-            airport_path = self.base_path / "Data" / self.dir_name / "Terminal" / icao
-            if not airport_path.exists():
+            data = self._find_charts(icao, search_type, code, filename)
+            if not data:
                 return None
 
-            charts = []
-            index_path = airport_path / "index.json"
-
-            if index_path.exists():
-                with open(index_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-
-                if code:
-                    # Match by code
-                    data = [x for x in data if x.get("code", "").upper() == code.upper()]
-                elif filename:
-                    # Search by filename
-                    data = [x for x in data if filename.lower() in x["name"].lower()]
-                elif search_type:
-                    if re.match(r"^\d{2}[LRC]?$", search_type):  # Runway number
-                        data = [x for x in data if search_type in x["name"]]
-                    else:  # Chart type
-                        data = [x for x in data if x["sort"] == search_type]
-
-                if not data:
-                    return None
-
-                return "\n".join([
-                    f"{x['id']}. [{x['sort'] or 'Uncategorized'}] {x['name']}"
-                    for x in data
-                ])
+            if session_id:
+                self._sessions.set(session_id, ListSession(
+                    icao=icao,
+                    filter_key=self.filter_key(search_type, code, filename),
+                    airport_path=self._airport_path(icao),
+                    charts={x.id: x for x in data}
+                ))
 
-            return None
+            return "\n".join([
+                f"{x.id}. [{x.sort or 'Uncategorized'}] {x.name}"
+                for x in data
+            ])
 
         except Exception as e:
             logger.error("Failed to get chart list", "eaip", e=e)
             return None
 
-    async def get_chart(self, icao: str, doc_id: str) -> Union[str, bytes]:
-        """Get specific chart"""
+    async def get_contact_sheet(self, icao: str, search_type: str = None,
+                                code: str = None, filename: str = None) -> Union[str, bytes]:
+        """Get a numbered thumbnail grid of the filtered charts"""
         try:
-            airport_path = self.base_path / "Data" / self.dir_name / "Terminal" / icao
-            if not airport_path.exists():
-                return f"No charts found for airport {icao}"
+            data = self._find_charts(icao, search_type, code, filename)
+            if not data:
+                return "No charts found"
+
+            # Sheets are cached per cycle and filter
+            key = hashlib.sha1(f"{search_type}|{code}|{filename}".encode("utf-8")).hexdigest()[:12]
+            cache_path = self.base_path / "Cache" / "sheet" / f"{icao}-{key}.png"
+            if cache_path.exists():
+                return cache_path.read_bytes()
+
+            airport_path = self._airport_path(icao)
+            entries = [
+                (f"{x.id}. {x.code or x.sort}", self._chart_source(airport_path, x))
+                for x in data[:MAX_SHEET_CHARTS]
+            ]
+            image = await asyncio.get_running_loop().run_in_executor(None, render_contact_sheet, entries)
+
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_bytes(image)
+            if len(data) > MAX_SHEET_CHARTS:
+                logger.info(f"Contact sheet truncated to {MAX_SHEET_CHARTS} charts", "eaip",
+                            param={"icao": icao, "charts": len(data)})
+            return image
 
-            index_path = airport_path / "index.json"
-            if not index_path.exists():
-                return "Index file not found"
+        except Exception as e:
+            logger.error("Failed to get contact sheet", "eaip", e=e)
+            return f"Failed to get contact sheet: {e}"
 
-            with open(index_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+    async def get_chart(self, icao: str, doc_id: str,
+                        options: Optional[RenderOptions] = None) -> Union[str, bytes, Path]:
+        """Get specific chart"""
+        try:
+            index = self._get_index(icao)
+            if index is None:
+                return self._missing_index_message(icao)
 
-            chart = next((x for x in data if str(x["id"]) == str(doc_id)), None)
+            chart = index.get(doc_id)
             if not chart:
                 return f"Chart with ID {doc_id} not found"
 
-            pdf_path = airport_path / chart["path"]
-            if not pdf_path.exists():
+            source = self._chart_source(self._airport_path(icao), chart)
+            if isinstance(source, Path) and not source.exists():
                 return "Chart file does not exist"
 
-            return await self._convert_pdf_to_image(pdf_path)
+            return await self._deliver(source, chart, options)
 
         except Exception as e:
             logger.error("Failed to get chart", "eaip", e=e)
             return f"Failed to get chart: {e}"
 
-    async def get_chart_by_selection(self, icao: str, selection: str) -> Union[str, bytes]:
-        """Get chart by user selection"""
+    async def get_chart_by_selection(self, session_id: str, selection: str,
+                                     options: Optional[RenderOptions] = None) -> Union[str, bytes, Path]:
+        """Get chart by user selection from the last list shown in the session"""
         try:
-            airport_path = self.base_path / "Data" / self.dir_name / "Terminal" / icao
-            index_path = airport_path / "index.json"
-
-            if not index_path.exists():
-                return "Index file not found"
-
-            with open(index_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            try:
-                idx = int(selection) - 1
-                if not 0 <= idx < len(data):
-                    return "Invalid selection number"
-
-                chart = data[idx]
-                pdf_path = airport_path / chart["path"]
-                if not pdf_path.exists():
-                    return "Chart file does not exist"
+            session: Optional[ListSession] = self._sessions.get(session_id)
+            if session is None:
+                return "Selection expired, please query again"
 
-                return await self._convert_pdf_to_image(pdf_path)
+            chart = session.charts.get(selection.strip())
+            if not chart:
+                return "Invalid selection number"
 
-            except ValueError:
-                return "Invalid selection"
+            return await self._deliver(
+                self._chart_source(session.airport_path, chart), chart, options
+            )
 
         except Exception as e:
             logger.error("Failed to get selected chart", "eaip", e=e)
             return f"Failed to get selected chart: {e}"
 
-    async def get_chart_by_code(self, icao: str, code: str) -> Union[str, bytes]:
+    async def get_chart_by_code(self, icao: str, code: str,
+                                options: Optional[RenderOptions] = None) -> Union[str, bytes, Path]:
         """Get chart directly by code"""
         try:
-            airport_path = self.base_path / "Data" / self.dir_name / "Terminal" / icao
-            if not airport_path.exists():
-                return f"No charts found for airport {icao}"
-
-            index_path = airport_path / "index.json"
-            if not index_path.exists():
-                return "Index file not found"
-
-            with open(index_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            index = self._get_index(icao)
+            if index is None:
+                return self._missing_index_message(icao)
 
             # Exact match by code
-            chart = next((x for x in data if x.get("code", "").upper() == code.upper()), None)
-            if not chart:
+            charts = index.with_code(code)
+            if not charts:
                 return f"Chart with code {code} not found"
 
-            pdf_path = airport_path / chart["path"]
-            if not pdf_path.exists():
+            source = self._chart_source(self._airport_path(icao), charts[0])
+            if isinstance(source, Path) and not source.exists():
                 return "Chart file does not exist"
 
-            return await self._convert_pdf_to_image(pdf_path)
+            return await self._deliver(source, charts[0], options)
 
         except Exception as e:
             logger.error("Failed to get chart", "eaip", e=e)
             return f"Failed to get chart: {e}"
 
-    async def _convert_pdf_to_image(self, pdf_path: Path) -> bytes:
-        """Convert PDF to image"""
+    @staticmethod
+    def filter_key(search_type: str = None, code: str = None, filename: str = None) -> str:
+        """Identify a list filter for selection statistics"""
+        return f"{search_type or ''}|{code or ''}|{filename or ''}"
+
+    def record_selection(self, session_id: str, chart_id: str) -> None:
+        """Remember which chart was picked from the session list
+
+        The statistics file is written in a worker thread, selections made
+        meanwhile are written together.
+        """
+        session: Optional[ListSession] = self._sessions.get(session_id)
+        if session is None or chart_id not in session.charts:
+            return
+        if not self.selection_stats.record(session.icao, session.filter_key, chart_id):
+            return
+
+        def _saved(future: asyncio.Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                logger.warning("Failed to save selection statistics", "eaip", e=future.exception())
+
+        asyncio.get_running_loop().run_in_executor(None, self.selection_stats.save).add_done_callback(_saved)
+
+    def start_prefetch(self, session_id: str,
+                       options: Optional[RenderOptions] = None) -> List[Future]:
+        """Render the charts of the session list most likely to be selected in background"""
+        limit = Config.get_config("eaip", "PREFETCH_COUNT", 2)
+        if not limit or (options and options.fmt != "png"):
+            return []
         try:
-            doc = pymupdf.open(str(pdf_path))
-            page = doc[0]
-            zoom = 2.8
-            mat = pymupdf.Matrix(zoom, zoom)
-            pix = page.get_pixmap(
-                matrix=mat,
-                colorspace="rgb",
-                alpha=False,
-                annots=True
-            )
-            img_path = pdf_path.with_suffix('.png')
-            pix.save(str(img_path))
-            doc.close()
+            session: Optional[ListSession] = self._sessions.get(session_id)
+            if session is None:
+                return []
+
+            if len(session.charts) == 1:
+                picks = list(session.charts.values())
+            else:
+                ranked = self.selection_stats.rank(
+                    session.icao, session.filter_key, list(session.charts), limit
+                )
+                picks = [session.charts[x] for x in ranked]
+
+            futures = []
+            for chart in picks:
+                source = self._chart_source(session.airport_path, chart)
+                key = (str(source), options)
+                if key in self._render_cache or key in self._pending:
+                    continue
+                # Keep the executor job, only jobs that have not started can be cancelled
+                job = self._prefetch_executor.submit(self._render, source, options)
+                self._track_render(key, asyncio.wrap_future(job))
+                futures.append(job)
+            return futures
+
+        except Exception as e:
+            logger.warning("Failed to start chart prefetch", "eaip", e=e)
+            return []
+
+    @staticmethod
+    def cancel_prefetch(futures: List[Future]) -> None:
+        """Cancel speculative renders that have not started yet
+
+        Running renders are left to finish, their result is cached and a waiting
+        selection of the same chart picks it up.
+        """
+        for future in futures:
+            future.cancel()
+
+    def _track_render(self, key: RenderKey, future: asyncio.Future) -> None:
+        """Register an in-flight render and cache its result when done"""
+        self._pending[key] = future
+
+        def _done(fut: asyncio.Future) -> None:
+            if self._pending.get(key) is fut:
+                del self._pending[key]
+            if not fut.cancelled() and fut.exception() is None:
+                self._render_cache.set(key, fut.result())
+
+        future.add_done_callback(_done)
+
+    async def _deliver(self, source: ChartSource, chart: ChartRecord,
+                       options: Optional[RenderOptions] = None) -> Union[str, bytes, Path]:
+        """Produce a chart in the requested format, PNG bytes or a PDF file"""
+        if not chart.valid:
+            return "Chart file is corrupt, please report it to the bot admin"
+        if options and options.pages and chart.pages and options.pages[1] > chart.pages:
+            return f"Chart has only {chart.pages} page(s)"
+        if options and options.fmt == "pdf":
+            return await self._extract_pdf(source, chart, options)
+        return await self._convert_pdf_to_image(source, options, self._is_large_render(chart, options))
+
+    @staticmethod
+    def _is_large_render(chart: ChartRecord, options: Optional[RenderOptions]) -> bool:
+        """Whether a render will be banded, planned from the first page size in the index"""
+        options = options or RenderOptions()
+        if not chart.width or options.first_page != 0:
+            return False
+        return planned_pixels(chart.width, chart.height, options) > BAND_PIXELS
+
+    async def _render_large(self, source: ChartSource, options: Optional[RenderOptions]) -> bytes:
+        """Render a large chart, at most LARGE_RENDER_SLOTS at a time"""
+        async with self._large_renders:
+            return await asyncio.get_running_loop().run_in_executor(None, self._render, source, options)
+
+    async def _extract_pdf(self, source: ChartSource, chart: ChartRecord, options: RenderOptions) -> Path:
+        """Extract chart pages into a small PDF file, cached by content hash and page range"""
+        def _extract() -> Path:
+            # The index records the hash, so a cache hit does not read the chart
+            data = None if chart.sha1 else read_source(source)
+            digest = chart.sha1 or hashlib.sha1(data).hexdigest()
+            first, last = options.pages or (1, 1)
+            key = f"{digest[:16]}-{first}-{last}"
+            if options.region:
+                key += "-" + "-".join(f"{x:g}" for x in options.region)
+            # One directory per key so the file keeps the chart name for upload
+            pdf_path = self.base_path / "Cache" / "pdf" / key / chart.name
+            if not pdf_path.exists():
+                pdf_path.parent.mkdir(parents=True, exist_ok=True)
+                pdf_path.write_bytes(extract_pages(data or read_source(source), options))
+            return pdf_path
 
-            with open(img_path, 'rb') as f:
-                image_bytes = f.read()
-            img_path.unlink()  # Delete temporary file
-            return image_bytes
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, _extract)
+
+        except Exception as e:
+            logger.error("Failed to extract PDF pages", "eaip", e=e)
+            raise Exception(f"PDF extraction failed: {e}")
+
+    async def _convert_pdf_to_image(self, source: ChartSource,
+                                    options: Optional[RenderOptions] = None, large: bool = False) -> bytes:
+        """Convert PDF to image, large renders wait for a free slot"""
+        key = (str(source), options)
+        cached = self._render_cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            # Reuse a prefetch or concurrent render of the same chart
+            pending = self._pending.get(key)
+            if pending is not None and not pending.cancelled():
+                try:
+                    return await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+
+            if large:
+                future = asyncio.ensure_future(self._render_large(source, options))
+            else:
+                future = asyncio.get_running_loop().run_in_executor(None, self._render, source, options)
+            self._track_render(key, future)
+            return await future
 
         except Exception as e:
             logger.error("Failed to convert PDF to image", "eaip", e=e)
-            raise Exception(f"PDF to image conversion failed: {e}")
\ No newline at end of file
+            raise Exception(f"PDF to image conversion failed: {e}")
@@ -0,0 +1,132 @@
+"""
+Author: cg8-5712
+Date: 2025-05-02
+Version: 1.0.0
+License: GPL-3.0
+LastEditTime: 2025-07-21 11:20
+Title: eAIP Airport Names
+Description: City and airport names of the airports published in the eAIP, used to suggest
+ICAO codes when a user types a name. AD.JSON only carries chart titles, so the names are
+maintained here. Names are written "city/airport" in Chinese and "City Airport" in English;
+airports missing from this table are still found by their code.
+"""
+
+from typing import Dict, Tuple
+
+# ICAO -> (Chinese name, English name)
+AIRPORT_NAMES: Dict[str, Tuple[str, str]] = {
+    # North China
+    "ZBAA": ("北京/首都", "Beijing Capital"),
+    "ZBAD": ("北京/大兴", "Beijing Daxing"),
+    "ZBTJ": ("天津/滨海", "Tianjin Binhai"),
+    "ZBSJ": ("石家庄/正定", "Shijiazhuang Zhengding"),
+    "ZBHD": ("邯郸", "Handan"),
+    "ZBYN": ("太原/武宿", "Taiyuan Wusu"),
+    "ZBDT": ("大同/云冈", "Datong Yungang"),
+    "ZBHH": ("呼和浩特/白塔", "Hohhot Baita"),
+    "ZBOW": ("包头/东河", "Baotou Donghe"),
+    "ZBLA": ("海拉尔/东山", "Hailar Dongshan"),
+    "ZBCF": ("赤峰/玉龙", "Chifeng Yulong"),
+    "ZBUL": ("乌兰浩特/义勒力特", "Ulanhot Yileleite"),
+    "ZBXH": ("锡林浩特", "Xilinhot"),
+    # East China
+    "ZSPD": ("上海/浦东", "Shanghai Pudong"),
+    "ZSSS": ("上海/虹桥", "Shanghai Hongqiao"),
+    "ZSHC": ("杭州/萧山", "Hangzhou Xiaoshan"),
+    "ZSNB": ("宁波/栎社", "Ningbo Lishe"),
+    "ZSWZ": ("温州/龙湾", "Wenzhou Longwan"),
+    "ZSYW": ("义乌", "Yiwu"),
+    "ZSZS": ("舟山/普陀山", "Zhoushan Putuoshan"),
+    "ZSLQ": ("台州/路桥", "Taizhou Luqiao"),
+    "ZSNJ": ("南京/禄口", "Nanjing Lukou"),
+    "ZSWX": ("无锡/硕放", "Wuxi Shuofang"),
+    "ZSCG": ("常州/奔牛", "Changzhou Benniu"),
+    "ZSNT": ("南通/兴东", "Nantong Xingdong"),
+    "ZSYA": ("扬州/泰州", "Yangzhou Taizhou"),
+    "ZSYN": ("盐城/南洋", "Yancheng Nanyang"),
+    "ZSXZ": ("徐州/观音", "Xuzhou Guanyin"),
+    "ZSOF": ("合肥/新桥", "Hefei Xinqiao"),
+    "ZSTX": ("黄山/屯溪", "Huangshan Tunxi"),
+    "ZSAM": ("厦门/高崎", "Xiamen Gaoqi"),
+    "ZSFZ": ("福州/长乐", "Fuzhou Changle"),
+    "ZSQZ": ("泉州/晋江", "Quanzhou Jinjiang"),
+    "ZSWY": ("武夷山", "Wuyishan"),
+    "ZSCN": ("南昌/昌北", "Nanchang Changbei"),
+    "ZSGZ": ("赣州/黄金", "Ganzhou Huangjin"),
+    "ZSJD": ("景德镇", "Jingdezhen"),
+    "ZSJN": ("济南/遥墙", "Jinan Yaoqiang"),
+    "ZSQD": ("青岛/胶东", "Qingdao Jiaodong"),
+    "ZSYT": ("烟台/蓬莱", "Yantai Penglai"),
+    "ZSWH": ("威海/大水泊", "Weihai Dashuibo"),
+    "ZSLY": ("临沂/启阳", "Linyi Qiyang"),
+    # Central and South China
+    "ZHHH": ("武汉/天河", "Wuhan Tianhe"),
+    "ZHYC": ("宜昌/三峡", "Yichang Sanxia"),
+    "ZHXF": ("襄阳/刘集", "Xiangyang Liuji"),
+    "ZHES": ("恩施/许家坪", "Enshi Xujiaping"),
+    "ZHSY": ("十堰/武当山", "Shiyan Wudangshan"),
+    "ZHCC": ("郑州/新郑", "Zhengzhou Xinzheng"),
+    "ZHLY": ("洛阳/北郊", "Luoyang Beijiao"),
+    "ZHNY": ("南阳/姜营", "Nanyang Jiangying"),
+    "ZGHA": ("长沙/黄花", "Changsha Huanghua"),
+    "ZGDY": ("张家界/荷花", "Zhangjiajie Hehua"),
+    "ZGHY": ("衡阳/南岳", "Hengyang Nanyue"),
+    "ZGGG": ("广州/白云", "Guangzhou Baiyun"),
+    "ZGSZ": ("深圳/宝安", "Shenzhen Bao'an"),
+    "ZGSD": ("珠海/金湾", "Zhuhai Jinwan"),
+    "ZGOW": ("揭阳/潮汕", "Jieyang Chaoshan"),
+    "ZGZJ": ("湛江/吴川", "Zhanjiang Wuchuan"),
+    "ZGMX": ("梅州/梅县", "Meizhou Meixian"),
+    "ZGHZ": ("惠州/平潭", "Huizhou Pingtan"),
+    "ZGNN": ("南宁/吴圩", "Nanning Wuxu"),
+    "ZGKL": ("桂林/两江", "Guilin Liangjiang"),
+    "ZGBH": ("北海/福成", "Beihai Fucheng"),
+    "ZGWZ": ("梧州/西江", "Wuzhou Xijiang"),
+    "ZJHK": ("海口/美兰", "Haikou Meilan"),
+    "ZJSY": ("三亚/凤凰", "Sanya Phoenix"),
+    "ZJQH": ("琼海/博鳌", "Qionghai Bo'ao"),
+    # Southwest China
+    "ZUUU": ("成都/双流", "Chengdu Shuangliu"),
+    "ZUTF": ("成都/天府", "Chengdu Tianfu"),
+    "ZUCK": ("重庆/江北", "Chongqing Jiangbei"),
+    "ZUMY": ("绵阳/南郊", "Mianyang Nanjiao"),
+    "ZUYB": ("宜宾/五粮液", "Yibin Wuliangye"),
+    "ZULZ": ("泸州/云龙", "Luzhou Yunlong"),
+    "ZUNC": ("南充/高坪", "Nanchong Gaoping"),
+    "ZUXC": ("西昌/青山", "Xichang Qingshan"),
+    "ZUJZ": ("九寨/黄龙", "Jiuzhai Huanglong"),
+    "ZUGY": ("贵阳/龙洞堡", "Guiyang Longdongbao"),
+    "ZUZY": ("遵义/新舟", "Zunyi Xinzhou"),
+    "ZULS": ("拉萨/贡嘎", "Lhasa Gonggar"),
+    "ZPPP": ("昆明/长水", "Kunming Changshui"),
+    "ZPLJ": ("丽江/三义", "Lijiang Sanyi"),
+    "ZPDL": ("大理", "Dali"),
+    "ZPJH": ("西双版纳/嘎洒", "Xishuangbanna Gasa"),
+    "ZPBS": ("保山/云瑞", "Baoshan Yunrui"),
+    "ZPMS": ("德宏/芒市", "Dehong Mangshi"),
+    # Northwest China
+    "ZLXY": ("西安/咸阳", "Xi'an Xianyang"),
+    "ZLYA": ("延安/南泥湾", "Yan'an Nanniwan"),
+    "ZLYL": ("榆林/榆阳", "Yulin Yuyang"),
+    "ZLLL": ("兰州/中川", "Lanzhou Zhongchuan"),
+    "ZLDH": ("敦煌/莫高", "Dunhuang Mogao"),
+    "ZLJQ": ("嘉峪关/酒泉", "Jiayuguan Jiuquan"),
+    "ZLXN": ("西宁/曹家堡", "Xining Caojiabao"),
+    "ZLIC": ("银川/河东", "Yinchuan Hedong"),
+    "ZWWW": ("乌鲁木齐/天山", "Urumqi Tianshan"),
+    "ZWSH": ("喀什/徕宁", "Kashgar Laining"),
+    "ZWKL": ("库尔勒/梨城", "Korla Licheng"),
+    "ZWAK": ("阿克苏/红旗坡", "Aksu Hongqipo"),
+    "ZWYN": ("伊宁", "Yining"),
+    "ZWTN": ("和田/昆冈", "Hotan Kungang"),
+    # Northeast China
+    "ZYTX": ("沈阳/桃仙", "Shenyang Taoxian"),
+    "ZYTL": ("大连/周水子", "Dalian Zhoushuizi"),
+    "ZYHB": ("哈尔滨/太平", "Harbin Taiping"),
+    "ZYQQ": ("齐齐哈尔/三家子", "Qiqihar Sanjiazi"),
+    "ZYMD": ("牡丹江/海浪", "Mudanjiang Hailang"),
+    "ZYJM": ("佳木斯/东郊", "Jiamusi Dongjiao"),
+    "ZYHE": ("黑河/瑷珲", "Heihe Aihui"),
+    "ZYCC": ("长春/龙嘉", "Changchun Longjia"),
+    "ZYYJ": ("延吉/朝阳川", "Yanji Chaoyangchuan"),
+}
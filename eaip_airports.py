@@ -0,0 +1,139 @@
+"""
+Author: cg8-5712
+Date: 2025-05-02
+Version: 1.0.0
+License: GPL-3.0
+LastEditTime: 2025-07-21 11:20
+Title: eAIP Airport Directory
+Description: Airports of one AIRAC cycle, built once from the Terminal directory and the
+airport name table. Answers whether an airport exists without touching the filesystem, and
+suggests airports for a code prefix, a mistyped code, or a city or airport name using only
+in-memory lookups. Only exact codes are resolved: a near match may be a real airport that
+is missing from the cycle, so it is offered as a suggestion and never substituted.
+"""
+
+import bisect
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+MAX_SUGGESTIONS = 8
+# Separators inside names like "北京/首都" or "Xi'an Xianyang"
+NAME_SPLIT_PATTERN = re.compile(r"[\s/()（）,，'\-]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lower case without separators, "Xi'an/Xianyang" becomes xianxianyang"""
+    return NAME_SPLIT_PATTERN.sub("", name).lower()
+
+
+def _deletions(code: str) -> Set[str]:
+    """Variants of a code with one character removed"""
+    return {code[:i] + code[i + 1:] for i in range(len(code))}
+
+
+@dataclass(slots=True)
+class AirportMatch:
+    """Result of resolving a user query"""
+    # ICAO code of the cycle, None when the query is not an exact code
+    icao: Optional[str] = None
+    # Airports the user may have meant, shown as "ZBAA 北京/首都 Beijing Capital"
+    suggestions: List[str] = field(default_factory=list)
+
+
+class AirportDirectory:
+    """ICAO codes and names of the airports in a cycle
+
+    >>> airports = AirportDirectory(["ZBAA", "ZBAD", "ZSPD"], {
+    ...     "ZBAA": ("北京/首都", "Beijing Capital"), "ZBAD": ("北京/大兴", "Beijing Daxing"),
+    ...     "ZSSS": ("上海/虹桥", "Shanghai Hongqiao")})
+    >>> airports.resolve("北京").suggestions
+    ['ZBAA 北京/首都 Beijing Capital', 'ZBAD 北京/大兴 Beijing Daxing']
+    >>> airports.resolve("capital")
+    AirportMatch(icao=None, suggestions=['ZBAA 北京/首都 Beijing Capital'])
+    >>> airports.resolve("虹桥").suggestions
+    []
+    >>> airports.resolve("zbaa").icao
+    'ZBAA'
+    """
+
+    __slots__ = ("icaos", "_labels", "_sorted_codes", "_sorted_names", "_deletion_index")
+
+    def __init__(self, icaos: Iterable[str],
+                 names: Optional[Mapping[str, Sequence[str]]] = None) -> None:
+        self.icaos = frozenset(x.upper() for x in icaos)
+        names = {icao: values for icao, values in (names or {}).items() if icao in self.icaos}
+        # ICAO -> suggestion text with the names of the airport
+        self._labels: Dict[str, str] = {
+            icao: " ".join([icao, *values]) for icao, values in names.items()
+        }
+        self._sorted_codes: List[str] = sorted(self.icaos)
+        # Sorted (name key, ICAO) pairs of full names and name parts, for prefix lookups
+        keys: Set[Tuple[str, str]] = set()
+        for icao, values in names.items():
+            for value in values:
+                parts = [value] + NAME_SPLIT_PATTERN.split(value)
+                keys.update((normalize_name(x), icao) for x in parts if normalize_name(x))
+        self._sorted_names: List[Tuple[str, str]] = sorted(keys)
+        # One-deletion variants of each code, finds substitutions, transpositions,
+        # missing and extra letters with dict lookups only
+        self._deletion_index = {}
+        for icao in self.icaos:
+            for key in _deletions(icao) | {icao}:
+                self._deletion_index.setdefault(key, set()).add(icao)
+
+    def __contains__(self, icao: str) -> bool:
+        return icao in self.icaos
+
+    def __len__(self) -> int:
+        return len(self.icaos)
+
+    def _with_prefix(self, prefix: str) -> List[str]:
+        """Codes starting with prefix"""
+        i = bisect.bisect_left(self._sorted_codes, prefix)
+        found = []
+        while i < len(self._sorted_codes) and self._sorted_codes[i].startswith(prefix) \
+                and len(found) < MAX_SUGGESTIONS:
+            found.append(self._sorted_codes[i])
+            i += 1
+        return found
+
+    def _with_name(self, query: str) -> List[str]:
+        """Codes of airports with a name or name part starting with query"""
+        key = normalize_name(query)
+        if not key:
+            return []
+        found: List[str] = []
+        i = bisect.bisect_left(self._sorted_names, (key, ""))
+        while i < len(self._sorted_names) and self._sorted_names[i][0].startswith(key):
+            if self._sorted_names[i][1] not in found:
+                found.append(self._sorted_names[i][1])
+            i += 1
+        return sorted(found)[:MAX_SUGGESTIONS]
+
+    def label(self, icao: str) -> str:
+        """Code and names of an airport, as shown in suggestions"""
+        return self._labels.get(icao, icao)
+
+    def _close_codes(self, code: str) -> List[str]:
+        """Codes within one edit of code"""
+        found: Set[str] = set()
+        for key in _deletions(code) | {code}:
+            found |= self._deletion_index.get(key, set())
+        return sorted(found)[:MAX_SUGGESTIONS]
+
+    def resolve(self, query: str) -> AirportMatch:
+        """Resolve a query to an airport
+
+        Exact codes resolve; otherwise airports with a name starting with the query,
+        codes starting with it and codes one edit away from it are suggested. A name
+        matching a single airport is suggested too, not substituted.
+        """
+        code = query.strip().upper()
+        if code in self.icaos:
+            return AirportMatch(icao=code)
+        found = self._with_name(query)
+        if code.isascii() and code.isalnum():
+            codes = self._with_prefix(code) if len(code) < 4 else self._close_codes(code)
+            found += [x for x in codes if x not in found]
+        return AirportMatch(suggestions=[self.label(x) for x in found[:MAX_SUGGESTIONS]])
@@ -0,0 +1,115 @@
+"""
+Author: cg8-5712
+Date: 2025-05-02
+Version: 1.0.0
+License: GPL-3.0
+LastEditTime: 2025-07-21 15:10
+Title: eAIP Release Archive
+Description: Read-only access to an eAIP release zip. Charts are indexed and served
+straight from the archive members, so a cycle can be imported without extracting it.
+"""
+
+import json
+import threading
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .eaip_cache import LRUCache
+
+AD_JSON_MEMBER = "Data/JsonPath/AD.JSON"
+MEMBER_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ReleaseArchive:
+    """eAIP release zip opened once and shared between renders"""
+
+    def __init__(self, path: Path, cache_bytes: int = MEMBER_CACHE_BYTES) -> None:
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self._lock = threading.Lock()
+        self._cache = LRUCache(max_items=128, max_bytes=cache_bytes)
+        # Normalized member name -> name stored in the archive
+        self._members: Dict[str, str] = {
+            info.filename.replace("\\", "/"): info.filename
+            for info in self._zip.infolist()
+            if not info.is_dir()
+        }
+        # Releases are sometimes zipped with an extra top level folder
+        self.prefix = ""
+        for name in self._members:
+            if name.upper().endswith(AD_JSON_MEMBER.upper()):
+                self.prefix = name[:-len(AD_JSON_MEMBER)]
+                break
+
+    @property
+    def ad_json_member(self) -> Optional[str]:
+        """Archive member of AD.JSON"""
+        return self.member(AD_JSON_MEMBER)
+
+    def member(self, release_path: str) -> Optional[str]:
+        """Resolve a path relative to the release root, like AD.JSON pdfPath, to a member"""
+        name = self.prefix + release_path.replace("\\", "/").lstrip("/")
+        if name in self._members:
+            return name
+        # Fall back to a case insensitive match
+        upper = name.upper()
+        return next((x for x in self._members if x.upper() == upper), None)
+
+    def read(self, member: str, cached: bool = True) -> bytes:
+        """Read member bytes through the member cache
+
+        Without cached the member is read straight from the zip, for one-off reads
+        like indexing that would only evict the charts being served.
+        """
+        data = self._cache.get(member) if cached else None
+        if data is None:
+            with self._lock:
+                data = self._zip.read(self._members[member])
+            if cached:
+                self._cache.set(member, data)
+        return data
+
+    def load_ad_json(self) -> List[Dict[str, Any]]:
+        """Load the chart list of the release"""
+        member = self.ad_json_member
+        if member is None:
+            raise ValueError(f"AD.JSON not found in {self.path}")
+        with self._lock:
+            return json.loads(self._zip.read(self._members[member]).decode("utf-8"))
+
+    def eaip_dir_name(self) -> Optional[str]:
+        """Name of the EAIP folder under Data, like EAIP2025-05.V1.3"""
+        for name in self._members:
+            parts = name[len(self.prefix):].split("/")
+            if len(parts) > 2 and parts[0] == "Data" and parts[1].startswith("EAIP"):
+                return parts[1]
+        return None
+
+    def close(self) -> None:
+        """Close the archive"""
+        self._cache.clear()
+        with self._lock:
+            self._zip.close()
+
+
+class ArchiveMember:
+    """A chart PDF stored in a release archive"""
+
+    __slots__ = ("archive", "name")
+
+    def __init__(self, archive: ReleaseArchive, name: str) -> None:
+        self.archive = archive
+        self.name = name
+
+    def read(self) -> bytes:
+        """Read the PDF bytes"""
+        return self.archive.read(self.name)
+
+    def __str__(self) -> str:
+        return f"{self.archive.path}!{self.name}"
+
+
+def find_release_archive(base_path: Path) -> Optional[Path]:
+    """Find an eAIP release zip in a cycle directory"""
+    return next(iter(sorted(base_path.glob("*.zip"))), None) if base_path.exists() else None
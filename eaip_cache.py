@@ -0,0 +1,410 @@
+"""
+Author: cg8-5712
+Date: 2025-05-02
+Version: 1.0.0
+License: GPL-3.0
+LastEditTime: 2025-07-21 16:00
+Title: eAIP Caches
+Description: Caches used by the chart handler: a size bounded LRU cache with optional
+expiry for rendered charts and list sessions, persisted chart selection statistics used
+to decide which charts are worth rendering ahead of time, and key-value backends for
+sharing rendered charts and list images between bot processes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Locks of the file backend are striped by key hash, unrelated keys rarely share one
+LOCK_STRIPES = 256
+# Share of max_bytes kept when the file backend is pruned
+PRUNE_TARGET = 0.9
+
+
+class LRUCache:
+    """Least recently used cache bounded by item count and total size
+
+    With ttl set, entries also expire that many seconds after they were stored.
+    """
+
+    def __init__(self, max_items: int = 128, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = len, ttl: Optional[float] = None) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._expires: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value and mark it as recently used"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            if self.ttl is not None and self._expires[key] < time.monotonic():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if needed"""
+        size = self.sizeof(value) if self.max_bytes else 0
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if self.max_bytes and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self.total_bytes += size
+            if self.ttl is not None:
+                self._expires[key] = time.monotonic() + self.ttl
+            while len(self._data) > self.max_items or (
+                    self.max_bytes and self.total_bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a value"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._pop(key)
+
+    def clear(self) -> None:
+        """Remove all values"""
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self.total_bytes = 0
+
+    def _pop(self, key: Hashable) -> Any:
+        value = self._data.pop(key)
+        self._expires.pop(key, None)
+        if self.max_bytes:
+            self.total_bytes -= self.sizeof(value)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SelectionStats:
+    """How often each chart was picked from a list, per airport and filter
+
+    Selections are counted in memory and written by save, which merges them into
+    the file under a lock so that bot processes sharing it keep each other's counts.
+    """
+
+    # Key used for counts over all filters of an airport
+    ANY_FILTER = "*"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._counts = self._load()
+        # Selections not written yet, and whether a save is already scheduled for them
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._save_scheduled = False
+
+    def _load(self) -> Dict[str, Dict[str, int]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _key(icao: str, filter_key: str) -> str:
+        return f"{icao}|{filter_key}"
+
+    @staticmethod
+    def _merge(target: Dict[str, Dict[str, int]], source: Dict[str, Dict[str, int]]) -> None:
+        for key, values in source.items():
+            counts = target.setdefault(key, {})
+            for chart_id, count in values.items():
+                counts[chart_id] = counts.get(chart_id, 0) + count
+
+    def record(self, icao: str, filter_key: str, chart_id: str) -> bool:
+        """Count a selection in memory
+
+        Returns True when the caller has to schedule save; selections recorded while
+        a save is already scheduled are written by that save.
+        """
+        selection = {
+            self._key(icao, filter_key): {chart_id: 1},
+            self._key(icao, self.ANY_FILTER): {chart_id: 1},
+        }
+        with self._lock:
+            self._merge(self._counts, selection)
+            self._merge(self._pending, selection)
+            schedule = not self._save_scheduled
+            self._save_scheduled = True
+        return schedule
+
+    def save(self) -> None:
+        """Merge the pending selections into the statistics file, runs in a worker thread
+
+        The file is replaced atomically, readers never see a partial file.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._save_scheduled = False
+        if not pending:
+            return
+
+        try:
+            with file_lock(self.path.with_name(f"{self.path.name}.lock")):
+                counts = self._load()
+                self._merge(counts, pending)
+                tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(counts, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+        except Exception:
+            # Keep the selections for the next save
+            with self._lock:
+                self._merge(self._pending, pending)
+            raise
+
+        with self._lock:
+            # Counts of the other processes, plus selections recorded meanwhile
+            self._merge(counts, self._pending)
+            self._counts = counts
+
+    def rank(self, icao: str, filter_key: str, chart_ids: Sequence[str], limit: int) -> List[str]:
+        """Get up to limit previously selected charts, most frequent first
+
+        Counts for the same filter come first, counts over all filters break ties.
+        """
+        by_filter = self._counts.get(self._key(icao, filter_key), {})
+        by_airport = self._counts.get(self._key(icao, self.ANY_FILTER), {})
+        scored = [
+            (by_filter.get(x, 0), by_airport.get(x, 0), x)
+            for x in chart_ids
+            if by_airport.get(x, 0) > 0
+        ]
+        scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+        return [x[2] for x in scored[:limit]]
+
+
+@contextmanager
+def file_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """Exclusive lock on a lock file, shared by all processes and threads
+
+    Yields False when blocking is off and the lock is held elsewhere.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            return
+
+        f.seek(0)
+        while True:
+            try:
+                # LK_LOCK gives up after about 10 seconds, keep waiting for a long render
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if not blocking:
+                    yield False
+                    return
+        try:
+            yield True
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CacheBackend(ABC):
+    """Key-value store for rendered images, keys are strings and values bytes
+
+    get_or_create runs create at most once per key at a time, other callers wait
+    for its result. Implementations must be safe to use from several threads.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Get a value, None when missing"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        """Store a value"""
+
+    @abstractmethod
+    def get_or_create(self, key: str, create: Callable[[], bytes]) -> bytes:
+        """Get a value, creating and storing it with create when missing"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all values"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process backend, stand-in for a shared store when only one bot runs"""
+
+    def __init__(self, max_bytes: int) -> None:
+        self._cache = LRUCache(max_items=1024, max_bytes=max_bytes)
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self._cache.set(key, value)
+
+    def get_or_create(self, key: str, create: Callable[[], bytes]) -> bytes:
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+        with self._locks[hash(key) % LOCK_STRIPES]:
+            value = self._cache.get(key)
+            if value is None:
+                value = create()
+                self._cache.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class FileCacheBackend(CacheBackend):
+    """Backend in a directory shared by several bot processes on one host or a shared volume
+
+    Values are written to a temporary file and moved into place, so readers never
+    see partial data and need no lock. get_or_create holds a cross-process lock
+    while creating, so a chart is rendered by one process and read by the others.
+    The directory is pruned to max_bytes, least recently used files first.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, prune_every: int = 64) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._data_path = path / "data"
+        self._lock_path = path / "locks"
+        self._writes = 0
+        self._data_path.mkdir(parents=True, exist_ok=True)
+
+    def _file(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self._data_path / digest[:2] / digest
+
+    def _key_lock(self, key: str) -> Path:
+        stripe = int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:4], 16) % LOCK_STRIPES
+        return self._lock_path / f"{stripe:03d}.lock"
+
+    def get(self, key: str) -> Optional[bytes]:
+        file = self._file(key)
+        try:
+            value = file.read_bytes()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        try:
+            # Mark as recently used for pruning
+            os.utime(file)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        file = self._file(key)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file.with_name(f"{file.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(value)
+        os.replace(tmp_path, file)
+
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def get_or_create(self, key: str, create: Callable[[], bytes]) -> bytes:
+        value = self.get(key)
+        if value is not None:
+            return value
+        with file_lock(self._key_lock(key)):
+            # Another process may have finished it while we waited
+            value = self.get(key)
+            if value is None:
+                value = create()
+                try:
+                    self.set(key, value)
+                except OSError:
+                    # A full or read-only cache directory must not fail the render
+                    pass
+        return value
+
+    def prune(self) -> None:
+        """Remove least recently used files above max_bytes, skipped while another process prunes"""
+        with file_lock(self._lock_path / "prune.lock", blocking=False) as locked:
+            if not locked:
+                return
+            files = []
+            now = time.time()
+            for file in self._data_path.glob("*/*"):
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                if file.name.endswith(".tmp"):
+                    # Left behind by a crashed writer
+                    if now - stat.st_mtime > 3600:
+                        file.unlink(missing_ok=True)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, file))
+
+            total = sum(x[1] for x in files)
+            if total <= self.max_bytes:
+                return
+            files.sort()
+            for _, size, file in files:
+                if total <= self.max_bytes * PRUNE_TARGET:
+                    break
+                file.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self) -> None:
+        for file in self._data_path.glob("*/*"):
+            file.unlink(missing_ok=True)
+
+
+def create_cache_backend(kind: str, path: Path, max_bytes: int) -> Optional[CacheBackend]:
+    """Create the configured backend: "file", "memory", or None when kind is empty"""
+    kind = (kind or "").strip().lower()
+    if not kind or max_bytes <= 0:
+        return None
+    if kind == "file":
+        return FileCacheBackend(path, max_bytes)
+    if kind == "memory":
+        return MemoryCacheBackend(max_bytes)
+    raise ValueError(f"Unknown cache backend: {kind}")
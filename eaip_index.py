@@ -0,0 +1,190 @@
+"""
+Author: cg8-5712
+Date: 2025-05-02
+Version: 1.0.0
+License: GPL-3.0
+LastEditTime: 2025-07-21 10:30
+Title: eAIP Chart Index
+Description: In-memory chart index for one airport. Index entries are loaded into
+compact slotted records with normalized fields precomputed, and each airport keeps
+secondary indexes by id, code, chart type and runway so lookups are dict accesses.
+"""
+
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# "RWY36R", "RWYS 01-19", "RWY16L/16R/17L/17R" ...
+RUNWAY_GROUP_PATTERN = re.compile(
+    r"RWYS?\s*((?:(?:0[1-9]|[12]\d|3[0-6])[LRC]?(?!\d)(?:\s*(?:[-/&,]|AND)\s*)?)+)",
+    re.IGNORECASE
+)
+RUNWAY_PATTERN = re.compile(r"(?:0[1-9]|[12]\d|3[0-6])[LRC]?", re.IGNORECASE)
+RECIPROCAL_SIDES = {"L": "R", "R": "L", "C": "C", "": ""}
+
+
+def parse_runways(name: str) -> List[str]:
+    """Parse runway designators following RWY in a chart name
+
+    >>> parse_runways("ZBAA-1A-IAC RWY36R")
+    ['36R']
+    >>> parse_runways("ZSPD-2A-SID RWYS 16L/16R/17L")
+    ['16L', '16R', '17L']
+    >>> parse_runways("ZGGG-3A-STAR RWY01-19")
+    ['01', '19']
+    >>> parse_runways("ZBAA-4A-IAC RWY00 RWY37")
+    []
+    """
+    runways: List[str] = []
+    for group in RUNWAY_GROUP_PATTERN.findall(name):
+        for runway in RUNWAY_PATTERN.findall(group):
+            runway = runway.upper()
+            if runway not in runways:
+                runways.append(runway)
+    return runways
+
+
+def is_runway(designator: str) -> bool:
+    """Check a runway designator, 01-36 with optional L/R/C
+
+    >>> is_runway("36R"), is_runway("09"), is_runway("00"), is_runway("99"), is_runway("37L")
+    (True, True, False, False, False)
+    """
+    return RUNWAY_PATTERN.fullmatch(designator) is not None
+
+
+def reciprocal_runway(runway: str) -> str:
+    """Get the designator of the opposite end, 18L -> 36R
+
+    >>> reciprocal_runway("18L"), reciprocal_runway("36R"), reciprocal_runway("01"), reciprocal_runway("09C")
+    ('36R', '18L', '19', '27C')
+    >>> reciprocal_runway("99")
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid runway designator: 99
+    """
+    if not is_runway(runway):
+        raise ValueError(f"Invalid runway designator: {runway}")
+    number = int(runway[:2])
+    side = runway[2:]
+    return f"{(number + 17) % 36 + 1:02d}{RECIPROCAL_SIDES.get(side, side)}"
+
+
+@dataclass(slots=True)
+class ChartRecord:
+    """One chart of an airport index"""
+    id: str
+    code: str
+    name: str
+    path: str
+    sort: str
+    runways: Tuple[str, ...] = ()
+    # Release archive holding the PDF, path is then the archive member name
+    archive: str = ""
+    # PDF details recorded at index time, pages is 0 for indexes built without them.
+    # width and height are the first page size in points, 0 when unknown
+    pages: int = 0
+    width: float = 0.0
+    height: float = 0.0
+    size: int = 0
+    sha1: str = ""
+    valid: bool = True
+    code_upper: str = field(init=False)
+    name_lower: str = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.code_upper = self.code.upper()
+        self.name_lower = self.name.lower()
+
+    @classmethod
+    def from_entry(cls, entry: Dict[str, Any]) -> "ChartRecord":
+        """Build a record from an index.json entry"""
+        return cls(
+            id=sys.intern(str(entry["id"])),
+            code=sys.intern(entry.get("code", "")),
+            name=entry["name"],
+            path=entry["path"],
+            sort=sys.intern(entry.get("sort", "")),
+            runways=tuple(
+                sys.intern(x) for x in entry.get("runways", parse_runways(entry["name"]))
+            ),
+            archive=sys.intern(entry.get("archive", "")),
+            pages=entry.get("pages", 0),
+            width=entry.get("width", 0.0),
+            height=entry.get("height", 0.0),
+            size=entry.get("size", 0),
+            sha1=entry.get("sha1", ""),
+            valid=entry.get("valid", True),
+        )
+
+
+class AirportIndex:
+    """Charts of one airport with secondary indexes"""
+
+    __slots__ = ("charts", "by_id", "by_code", "by_sort", "by_runway")
+
+    def __init__(self, charts: List[ChartRecord]) -> None:
+        self.charts = charts
+        self.by_id: Dict[str, ChartRecord] = {}
+        self.by_code: Dict[str, List[ChartRecord]] = {}
+        self.by_sort: Dict[str, List[ChartRecord]] = {}
+        # Runway designator -> charts, bare numbers also collect parallel runways
+        self.by_runway: Dict[str, List[ChartRecord]] = {}
+        for chart in charts:
+            self.by_id.setdefault(chart.id, chart)
+            self.by_code.setdefault(chart.code_upper, []).append(chart)
+            self.by_sort.setdefault(chart.sort, []).append(chart)
+            keys = set(chart.runways) | {x[:2] for x in chart.runways}
+            for key in keys:
+                self.by_runway.setdefault(key, []).append(chart)
+
+    @classmethod
+    def load(cls, index_path: Path) -> "AirportIndex":
+        """Load an airport index.json"""
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([ChartRecord.from_entry(x) for x in data])
+
+    def get(self, chart_id: str) -> Optional[ChartRecord]:
+        """Get chart by id"""
+        return self.by_id.get(str(chart_id))
+
+    def with_code(self, code: str) -> List[ChartRecord]:
+        """Get charts by code, case insensitive"""
+        return self.by_code.get(code.upper(), [])
+
+    def with_sort(self, sort: str) -> List[ChartRecord]:
+        """Get charts by chart type"""
+        return self.by_sort.get(sort, [])
+
+    def with_runway(self, runway: str) -> List[ChartRecord]:
+        """Get charts for a runway
+
+        "36" also matches 36L/36C/36R. When no chart names the runway, charts
+        published under the opposite end of the same strip are returned.
+        Designators outside 01-36 match nothing.
+
+        >>> index = AirportIndex([
+        ...     ChartRecord("1", "1A", "ZBAA-1A-IAC RWY18L", "a.pdf", "IAC", ("18L",)),
+        ...     ChartRecord("2", "2A", "ZBAA-2A-SID RWY09", "b.pdf", "SID", ("09",)),
+        ... ])
+        >>> [x.id for x in index.with_runway("18")], [x.id for x in index.with_runway("36R")]
+        (['1'], ['1'])
+        >>> index.with_runway("00"), index.with_runway("99"), index.with_runway("27L")
+        ([], [], [])
+        """
+        runway = runway.upper()
+        if not is_runway(runway):
+            return []
+        charts = self.by_runway.get(runway)
+        if charts is None:
+            charts = self.by_runway.get(reciprocal_runway(runway), [])
+        return charts
+
+    def search_name(self, keyword: str) -> List[ChartRecord]:
+        """Get charts whose file name contains keyword, case insensitive"""
+        keyword = keyword.lower()
+        return [x for x in self.charts if keyword in x.name_lower]
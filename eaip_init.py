@@ -3,19 +3,130 @@ Author: cg8-5712
 Date: 2025-05-02
 Version: 1.9.0
 License: GPL-3.0
-LastEditTime: 2025-07-03 21:40
+LastEditTime: 2025-07-21 15:10
 Title: AIP Chart Service
 Description: Service class for processing and managing aeronautical charts.
 """
 
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed, wait
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Set, Union
+import hashlib
 import json
+import logging
+import os
 import pymupdf
-from zhenxun.services.log import logger
-from zhenxun.configs.path_config import PLUGIN_DATA_PATH
-from zhenxun.configs.config import Config
+from .eaip_archive import ReleaseArchive
+from .eaip_index import parse_runways
+
+
+class StandaloneLogger:
+    """zhenxun日志接口的最小实现，脱离机器人独立运行时使用"""
+
+    def __init__(self, name: str = "eaip") -> None:
+        self.logger = logging.getLogger(name)
+
+    @staticmethod
+    def _format(info: str, command: Optional[str], param: Any = None,
+                target: Any = None, e: Optional[BaseException] = None) -> str:
+        message = f"[{command}] {info}" if command else info
+        if target is not None:
+            message += f" | {target}"
+        if param is not None:
+            message += f" | {param}"
+        if e is not None:
+            message += f" | {type(e).__name__}: {e}"
+        return message
+
+    def info(self, info: str, command: Optional[str] = None, **kwargs: Any) -> None:
+        self.logger.info(self._format(info, command, **kwargs))
+
+    def success(self, info: str, command: Optional[str] = None, **kwargs: Any) -> None:
+        self.logger.info(self._format(info, command, **kwargs))
+
+    def warning(self, info: str, command: Optional[str] = None, **kwargs: Any) -> None:
+        self.logger.warning(self._format(info, command, **kwargs))
+
+    def error(self, info: str, command: Optional[str] = None, **kwargs: Any) -> None:
+        self.logger.error(self._format(info, command, **kwargs))
+
+
+try:
+    from zhenxun.services.log import logger
+    from zhenxun.configs.config import Config
+except ImportError:
+    # 命令行独立导入时没有zhenxun
+    logger = StandaloneLogger()
+    Config = None
+
+# 进度回调: (操作, 已完成数量, 总数)
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def inspect_pdf(source: Union[Path, bytes]) -> Dict[str, Any]:
+    """校验PDF，返回页数、首页尺寸(pt)、文件大小和内容哈希"""
+    data = source.read_bytes() if isinstance(source, Path) else source
+    info: Dict[str, Any] = {
+        "pages": 0,
+        "size": len(data),
+        "sha1": hashlib.sha1(data).hexdigest(),
+        "valid": False
+    }
+    try:
+        with pymupdf.open(stream=data, filetype="pdf") as doc:
+            if doc.page_count == 0:
+                info["error"] = "no pages"
+                return info
+            page = doc[0]
+            # 解析页面内容，渲染时才会出现的错误在导入时就能发现
+            page.get_displaylist()
+            info.update(
+                pages=doc.page_count,
+                width=round(page.rect.width, 1),
+                height=round(page.rect.height, 1),
+                valid=True
+            )
+    except Exception as e:
+        info["error"] = str(e)
+    return info
+
+
+class ImportCheckpoint:
+    """导入检查点，记录已完成的操作和机场，中断后从上次位置继续"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.data: Dict[str, Any] = {"completed": [], "airports": {}}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def is_completed(self, action: str) -> bool:
+        """操作是否已全部完成"""
+        return action in self.data["completed"]
+
+    def done_airports(self, action: str) -> Set[str]:
+        """操作已处理完的机场"""
+        return set(self.data["airports"].get(action, []))
+
+    def mark_airport(self, action: str, airport: str) -> None:
+        """记录机场已处理完"""
+        self.data["airports"].setdefault(action, []).append(airport)
+        self.save()
+
+    def complete(self, action: str) -> None:
+        """记录操作已全部完成"""
+        self.data["completed"].append(action)
+        self.data["airports"].pop(action, None)
+        self.save()
+
+    def save(self) -> None:
+        """原子写入检查点文件"""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
 
 @dataclass
 class ChartFile:
@@ -42,14 +153,60 @@ class ChartProcessor:
 
     SPECIAL_CHART_TYPES = ["WAYPOINT LIST", "GMC", "APDC", "DATABASE CODING TABLE"]
 
-    def __init__(self, data_path: Path) -> None:
-        """初始化航图处理器"""
+    def __init__(self, data_path: Path, archive: Optional[Path] = None,
+                 dir_name: Optional[str] = None, dry_run: bool = False) -> None:
+        """初始化航图处理器
+
+        指定archive时直接索引发布压缩包，不解压文件；dry_run时只记录将要执行的修改。
+        打开的压缩包由close关闭，也可以用with语句
+        """
         self.data_path = data_path
-        self.dir_name = Config.get_config("eaip", "DIR_NAME", "EAIP2025-05.V1.3")
+        self.dry_run = dry_run
+        # 索引时发现的损坏PDF
+        self.invalid_files: List[str] = []
+        self.dir_name = dir_name or self._default_dir_name(data_path)
+        self.archive: Optional[ReleaseArchive] = None
+        if archive is not None:
+            self.archive = ReleaseArchive(archive)
+            self.dir_name = self.archive.eaip_dir_name() or self.dir_name
         self.ad_path = data_path / "Data" / self.dir_name / "Terminal"
         self.json_path = data_path / "Data" / "JsonPath" / "AD.JSON"
 
-        self._validate_paths()
+        try:
+            self._validate_paths()
+        except ValueError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """关闭发布压缩包"""
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def __enter__(self) -> "ChartProcessor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @staticmethod
+    def _default_dir_name(data_path: Path) -> str:
+        """读取配置中的DIR_NAME，独立运行时使用Data下的EAIP目录"""
+        if Config is not None:
+            return Config.get_config("eaip", "DIR_NAME", "EAIP2025-05.V1.3")
+        data_dir = data_path / "Data"
+        if data_dir.exists():
+            eaip_dirs = sorted(d.name for d in data_dir.iterdir() if d.is_dir() and d.name.startswith("EAIP"))
+            if eaip_dirs:
+                return eaip_dirs[0]
+        return "EAIP2025-05.V1.3"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """多进程导入时不传递压缩包句柄"""
+        state = self.__dict__.copy()
+        state["archive"] = None
+        return state
 
     def _validate_paths(self) -> None:
         """验证路径有效性"""
@@ -57,6 +214,12 @@ class ChartProcessor:
             logger.error("数据目录不存在", "航图处理", target=str(self.data_path))
             raise ValueError(f"数据目录不存在: {self.data_path}")
 
+        if self.archive is not None:
+            if self.archive.ad_json_member is None:
+                logger.error("压缩包中没有AD.JSON", "航图处理", target=str(self.archive.path))
+                raise ValueError(f"压缩包中没有AD.JSON: {self.archive.path}")
+            return
+
         if not self.ad_path.exists():
             logger.error("Terminal目录不存在", "航图处理", target=str(self.ad_path))
             raise ValueError(f"Terminal目录不存在: {self.ad_path}")
@@ -71,7 +234,8 @@ class ChartProcessor:
             logger.warning("文件夹不存在", "航图合并", target=str(folder_path))
             return None
 
-        pdf_files = sorted(folder_path.glob("*.pdf"))
+        # 跳过之前合并生成的文件，重复执行时不会把它再合并进去
+        pdf_files = sorted(x for x in folder_path.glob("*.pdf") if not x.name.endswith("-MERGED.pdf"))
         if not pdf_files:
             logger.warning("没有找到PDF文件", "航图合并", target=str(folder_path))
             return None
@@ -84,13 +248,17 @@ class ChartProcessor:
             )
             return None  # 或者 return pdf_files[0] 如果你希望返回单文件路径
 
+        merged_path = folder_path / f"{chart_type}-MERGED.pdf"
+        if self.dry_run:
+            logger.info("将合并PDF", "航图合并", target={"文件数量": len(pdf_files), "目标": str(merged_path)})
+            return None
+
         try:
             merged_doc = pymupdf.open()
             for pdf_path in pdf_files:
                 with pymupdf.open(str(pdf_path)) as doc:
                     merged_doc.insert_pdf(doc)
 
-            merged_path = folder_path / f"{chart_type}-MERGED.pdf"
             merged_doc.save(str(merged_path))
             merged_doc.close()
 
@@ -119,14 +287,19 @@ class ChartProcessor:
                 return path.parts[i + 1]
         return None
 
-    def _rename_chart_files(self) -> None:
-        """重命名航图文件"""
+    def _rename_chart_files(self, progress: Optional[ProgressCallback] = None) -> bool:
+        """重命名航图文件，有文件重命名失败时返回False"""
+        ok = True
         try:
             with open(self.json_path, "r", encoding="utf-8") as file:
                 chart_data = json.load(file)
             logger.info("读取航图数据", "航图处理", target=str(self.json_path))
 
-            for chart in chart_data:
+            total = len(chart_data)
+            for i, chart in enumerate(chart_data, 1):
+                if progress and (i % 200 == 0 or i == total):
+                    progress("rename", i, total)
+
                 if not chart.get("pdfPath"):
                     continue
 
@@ -141,14 +314,19 @@ class ChartProcessor:
                     )
                     continue
 
-                new_name = (chart["name"].replace(":", "-")
-                           .replace("/", "-")
-                           .replace("\\", "-") + ".pdf")
+                new_name = self._chart_file_name(chart["name"])
 
                 directory = self.ad_path / icao
                 new_path = directory / new_name
 
                 if old_path.exists():
+                    if self.dry_run:
+                        logger.info(
+                            "将重命名",
+                            "航图处理",
+                            param={"原路径": str(old_path), "新路径": str(new_path)}
+                        )
+                        continue
                     try:
                         new_path.parent.mkdir(parents=True, exist_ok=True)
                         old_path.rename(new_path)
@@ -158,12 +336,16 @@ class ChartProcessor:
                             param={"原路径": str(old_path), "新路径": str(new_path)}
                         )
                     except OSError as e:
+                        ok = False
                         logger.error(
                             "重命名失败",
                             "航图处理",
                             target=str(old_path),
                             e=e
                         )
+                elif new_path.exists() or any(directory.glob(f"*/{new_name}")):
+                    # 上次中断前已经处理过
+                    continue
                 else:
                     logger.warning(
                         "文件不存在",
@@ -173,89 +355,306 @@ class ChartProcessor:
 
         except Exception as e:
             logger.error("重命名过程失败", "航图处理", e=e)
+            return False
+        return ok
 
-    def _organize_airport_files(self) -> None:
-        """整理机场文件"""
+    def _airports(self) -> List[str]:
+        """Terminal目录下的机场"""
+        return sorted(d.name for d in self.ad_path.iterdir() if d.is_dir())
+
+    def _organize_airport(self, airport: str) -> Optional[int]:
+        """按航图类型整理单个机场的文件，返回移动的文件数量，失败时返回None"""
+        moved = 0
         try:
-            airports = [d.name for d in self.ad_path.iterdir() if d.is_dir()]
-            logger.info("开始整理机场文件", "航图处理", target={"机场数量": len(airports)})
-
-            for airport in airports:
-                airport_path = self.ad_path / airport
-                for pdf_file in airport_path.glob("*.pdf"):
-                    for chart_type in self.CHART_TYPES:
-                        if chart_type in pdf_file.name:
-                            type_folder = airport_path / chart_type
-                            type_folder.mkdir(parents=True, exist_ok=True)
-                            new_path = type_folder / pdf_file.name
-                            pdf_file.rename(new_path)
-                            logger.success(
-                                "移动文件完成",
+            airport_path = self.ad_path / airport
+            for pdf_file in airport_path.glob("*.pdf"):
+                for chart_type in self.CHART_TYPES:
+                    if chart_type in pdf_file.name:
+                        type_folder = airport_path / chart_type
+                        new_path = type_folder / pdf_file.name
+                        moved += 1
+                        if self.dry_run:
+                            logger.info(
+                                "将移动文件",
                                 "航图处理",
                                 param={"文件": str(pdf_file), "目标": str(new_path)}
                             )
                             break
+                        type_folder.mkdir(parents=True, exist_ok=True)
+                        pdf_file.rename(new_path)
+                        logger.success(
+                            "移动文件完成",
+                            "航图处理",
+                            param={"文件": str(pdf_file), "目标": str(new_path)}
+                        )
+                        break
 
         except Exception as e:
-            logger.error("整理文件失败", "航图处理", e=e)
+            logger.error("整理文件失败", "航图处理", target=airport, e=e)
+            return None
+        return moved
+
+    def _collect_airport(self, airport: str) -> List[Dict[str, Any]]:
+        """合并特殊图表并收集单个机场的索引条目，不包含PDF信息"""
+        airport_path = self.ad_path / airport
+        self._merge_special_charts(airport_path)
+
+        index_entries: List[Dict[str, Any]] = []
+        chart_id = 1
+
+        # 处理根目录下的PDF文件
+        for pdf_file in airport_path.glob("*.pdf"):
+            path = pdf_file.name.replace("\\", "/")
+            index_entries.append({
+                "id": str(chart_id),
+                "code": "general",
+                "name": pdf_file.name,
+                "path": path,
+                "sort": "general",  # 根目录下的文件标记为未分类
+                "runways": parse_runways(pdf_file.name)
+            })
+            chart_id += 1
+
+        # 处理子文件夹中的PDF文件
+        for folder in airport_path.iterdir():
+            if not folder.is_dir():
+                continue
+
+            for pdf_file in folder.glob("*.pdf"):
+                path = f"{folder.name}/{pdf_file.name}".replace("\\", "/")
+                index_entries.append({
+                    "id": str(chart_id),
+                    "code": str(pdf_file.name.split(folder.name)[0]).split(f"{airport}-")[-1],
+                    "name": pdf_file.name,
+                    "path": path,
+                    "sort": folder.name,
+                    "runways": parse_runways(pdf_file.name)
+                })
+                chart_id += 1
+
+        return index_entries
+
+    def _write_airport_index(self, airport: str, index_entries: List[Dict[str, Any]]) -> None:
+        """记录损坏的PDF并写入机场索引"""
+        for entry in index_entries:
+            if not entry.get("valid", True):
+                self.invalid_files.append(f"{airport}/{entry['path']}")
+                logger.warning(
+                    "PDF文件损坏",
+                    "航图处理",
+                    target=f"{airport}/{entry['path']}",
+                    param={"error": entry.get("error")}
+                )
+
+        if self.dry_run:
+            logger.info("将生成索引", "航图处理", param={"机场": airport, "图表数量": len(index_entries)})
+            return
+
+        airport_path = self.ad_path / airport
+        airport_path.mkdir(parents=True, exist_ok=True)
+        with open(airport_path / "index.json", "w", encoding="utf-8") as f:
+            json.dump(index_entries, f, ensure_ascii=False, indent=4)
 
-    def _generate_index(self) -> None:
-        """生成航图索引"""
+        logger.success(
+            "索引生成完成",
+            "航图处理",
+            param={"机场": airport, "图表数量": len(index_entries)}
+        )
+
+    def _index_airport(self, airport: str) -> Optional[int]:
+        """生成单个机场的航图索引，返回图表数量，失败时返回None"""
         try:
-            airports = [d.name for d in self.ad_path.iterdir() if d.is_dir()]
-
-            for airport in airports:
-                airport_path = self.ad_path / airport
-                self._merge_special_charts(airport_path)
-
-                index_entries: List[Dict[str, str]] = []
-                chart_id = 1
-
-                # 处理根目录下的PDF文件
-                for pdf_file in airport_path.glob("*.pdf"):
-                    path = pdf_file.name.replace("\\", "/")
-                    index_entries.append({
-                        "id": str(chart_id),
-                        "code": "general",
-                        "name": pdf_file.name,
-                        "path": path,
-                        "sort": "general"  # 根目录下的文件标记为未分类
-                    })
-                    chart_id += 1
-
-                # 处理子文件夹中的PDF文件
-                for folder in airport_path.iterdir():
-                    if not folder.is_dir():
+            index_entries = self._collect_airport(airport)
+            for entry in index_entries:
+                entry.update(inspect_pdf(self.ad_path / airport / entry["path"]))
+            self._write_airport_index(airport, index_entries)
+            return len(index_entries)
+
+        except Exception as e:
+            logger.error("生成索引失败", "航图处理", target=airport, e=e)
+            return None
+
+    def _run_index_parallel(self, airports: List[str], workers: int,
+                            finish: Callable[[str, bool], None]) -> None:
+        """多进程生成索引
+
+        先按机场收集条目，再把每个PDF的校验作为单独任务提交，
+        大机场不会拖住单个进程；机场的PDF全部校验完后写入索引
+        """
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            collecting: Dict[Future, str] = {
+                executor.submit(self._collect_airport, airport): airport for airport in airports
+            }
+            inspecting: Dict[Future, Any] = {}
+            entries: Dict[str, List[Dict[str, Any]]] = {}
+            remaining: Dict[str, int] = {}
+            live: Set[Future] = set(collecting)
+
+            def _write(airport: str) -> None:
+                try:
+                    self._write_airport_index(airport, entries.pop(airport))
+                except Exception as e:
+                    logger.error("生成索引失败", "航图处理", target=airport, e=e)
+                    finish(airport, False)
+                    return
+                finish(airport, True)
+
+            while live:
+                done, live = wait(live, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in collecting:
+                        airport = collecting.pop(future)
+                        try:
+                            entries[airport] = future.result()
+                        except Exception as e:
+                            logger.error("生成索引失败", "航图处理", target=airport, e=e)
+                            finish(airport, False)
+                            continue
+                        remaining[airport] = len(entries[airport])
+                        if not remaining[airport]:
+                            _write(airport)
+                            continue
+                        for entry in entries[airport]:
+                            inspect = executor.submit(inspect_pdf, self.ad_path / airport / entry["path"])
+                            inspecting[inspect] = (airport, entry)
+                            live.add(inspect)
                         continue
 
-                    for pdf_file in folder.glob("*.pdf"):
-                        path = f"{folder.name}/{pdf_file.name}".replace("\\", "/")
+                    airport, entry = inspecting.pop(future)
+                    try:
+                        entry.update(future.result())
+                    except Exception as e:
+                        # Unreadable file or crashed worker, index the chart as corrupt
+                        entry.update(pages=0, valid=False, error=str(e))
+                    remaining[airport] -= 1
+                    if not remaining[airport]:
+                        _write(airport)
+
+    def _run_airport_action(self, action: str, workers: int = 1,
+                            progress: Optional[ProgressCallback] = None,
+                            checkpoint: Optional[ImportCheckpoint] = None) -> bool:
+        """对每个机场执行整理或索引操作，可多进程并行，已记录在检查点中的机场会跳过
+
+        索引时逐个打开PDF校验，并记录页数、首页尺寸、文件大小和内容哈希。
+        只有成功的机场记入检查点，全部成功时返回True
+        """
+        handler = self._organize_airport if action == "organize" else self._index_airport
+        airports = self._airports()
+        done = checkpoint.done_airports(action) if checkpoint else set()
+        todo = [x for x in airports if x not in done]
+        finished = len(airports) - len(todo)
+        logger.info(f"开始{action}操作", "航图处理", target={"机场数量": len(airports), "待处理": len(todo)})
+
+        failed: List[str] = []
+
+        def _finish(airport: str, ok: bool) -> None:
+            nonlocal finished
+            finished += 1
+            if not ok:
+                failed.append(airport)
+            elif checkpoint and not self.dry_run:
+                checkpoint.mark_airport(action, airport)
+            if progress:
+                progress(action, finished, len(airports))
+
+        if action == "index" and workers > 1:
+            self._run_index_parallel(todo, workers, _finish)
+        elif workers > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(handler, airport): airport for airport in todo}
+                for future in as_completed(futures):
+                    try:
+                        ok = future.result() is not None
+                    except Exception as e:
+                        logger.error(f"{action}操作失败", "航图处理", target=futures[future], e=e)
+                        ok = False
+                    _finish(futures[future], ok)
+        else:
+            for airport in todo:
+                _finish(airport, handler(airport) is not None)
+
+        if failed:
+            logger.error(f"{action}操作有机场失败，重新运行时会重试", "航图处理", target=failed)
+        return not failed
+
+    @staticmethod
+    def _chart_file_name(name: str) -> str:
+        """由航图名称生成文件名"""
+        return name.replace(":", "-").replace("/", "-").replace("\\", "-") + ".pdf"
+
+    def _index_archive(self) -> bool:
+        """直接为发布压缩包生成航图索引，PDF保留在压缩包内，失败时返回False"""
+        if self.archive is None:
+            logger.error("未指定发布压缩包", "航图处理")
+            return False
+
+        try:
+            chart_data = self.archive.load_ad_json()
+            logger.info("读取航图数据", "航图处理", target=str(self.archive.path))
+
+            # 按机场和航图类型分组，根目录文件(general)在前，与目录索引顺序一致
+            airports: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+            for chart in chart_data:
+                if not chart.get("pdfPath"):
+                    continue
+
+                icao = self._get_icao_from_path(Path(chart["pdfPath"]))
+                if not icao:
+                    logger.warning("无法确定ICAO代码", "航图处理", target=chart["pdfPath"])
+                    continue
+
+                member = self.archive.member(chart["pdfPath"])
+                if member is None:
+                    logger.warning("压缩包中不存在文件", "航图处理", target=chart["pdfPath"])
+                    continue
+
+                name = self._chart_file_name(chart["name"])
+                sort = next((x for x in self.CHART_TYPES if x in name), "general")
+                groups = airports.setdefault(icao, {"general": []})
+                groups.setdefault(sort, []).append({
+                    "name": name,
+                    "member": member,
+                    # 每个文件只读一次，不经过压缩包的成员缓存
+                    "info": inspect_pdf(self.archive.read(member, cached=False))
+                })
+
+            archive_name = self.archive.path.name
+            for airport, groups in airports.items():
+                index_entries: List[Dict[str, Any]] = []
+                for sort, charts in groups.items():
+                    for chart in charts:
+                        code = "general" if sort == "general" else \
+                            str(chart["name"].split(sort)[0]).split(f"{airport}-")[-1]
                         index_entries.append({
-                            "id": str(chart_id),
-                            "code": str(pdf_file.name.split(folder.name)[0]).split(f"{airport}-")[-1],
-                            "name": pdf_file.name,
-                            "path": path,
-                            "sort": folder.name
+                            "id": str(len(index_entries) + 1),
+                            "code": code,
+                            "name": chart["name"],
+                            "path": chart["member"],
+                            "sort": sort,
+                            "runways": parse_runways(chart["name"]),
+                            "archive": archive_name,
+                            **chart["info"]
                         })
-                        chart_id += 1
-
-                index_file = airport_path / "index.json"
-                with open(index_file, "w", encoding="utf-8") as f:
-                    json.dump(index_entries, f, ensure_ascii=False, indent=4)
 
-                logger.success(
-                    "索引生成完成",
-                    "航图处理",
-                    param={"机场": airport, "图表数量": len(index_entries)}
-                )
+                self._write_airport_index(airport, index_entries)
 
         except Exception as e:
-            logger.error("生成索引失败", "航图处理", e=e)
-
-    def update(self, actions: Optional[List[str]] = None) -> None:
-        """更新机场航图数据"""
-        valid_actions = ["rename", "organize", "index"]
-        actions_to_run = actions if actions else valid_actions
+            logger.error("生成压缩包索引失败", "航图处理", e=e)
+            return False
+        return True
+
+    def update(self, actions: Optional[List[str]] = None, workers: int = 1,
+               progress: Optional[ProgressCallback] = None,
+               checkpoint: Optional[ImportCheckpoint] = None) -> bool:
+        """更新机场航图数据，全部操作成功时返回True
+
+        workers大于1时整理和索引按机场多进程并行；指定checkpoint时跳过已完成的操作和机场。
+        操作失败时不记入检查点并停止后续操作，重新运行会从失败处重试
+        """
+        valid_actions = ["rename", "organize", "index", "archive"]
+        actions_to_run = actions if actions else (
+            ["archive"] if self.archive is not None else ["rename", "organize", "index"]
+        )
 
         if not isinstance(actions_to_run, list):
             logger.error(
@@ -263,7 +662,7 @@ class ChartProcessor:
                 "航图处理",
                 target={"actions": actions_to_run}
             )
-            return
+            return False
 
         invalid_actions = [act for act in actions_to_run if act not in valid_actions]
         if invalid_actions:
@@ -272,17 +671,27 @@ class ChartProcessor:
                 "航图处理",
                 target={"invalid_actions": invalid_actions}
             )
-            return
+            return False
 
         try:
             for action in actions_to_run:
+                if checkpoint and checkpoint.is_completed(action):
+                    logger.info(f"{action}操作已完成，跳过", "航图处理")
+                    continue
+
                 logger.info(f"执行{action}操作", "航图处理")
                 if action == "rename":
-                    self._rename_chart_files()
-                elif action == "organize":
-                    self._organize_airport_files()
-                elif action == "index":
-                    self._generate_index()
+                    ok = self._rename_chart_files(progress)
+                elif action in ("organize", "index"):
+                    ok = self._run_airport_action(action, workers, progress, checkpoint)
+                else:
+                    ok = self._index_archive()
+
+                if not ok:
+                    logger.error(f"{action}操作未全部成功，已停止", "航图处理")
+                    return False
+                if checkpoint and not self.dry_run:
+                    checkpoint.complete(action)
 
             logger.success(
                 "更新完成",
@@ -290,5 +699,8 @@ class ChartProcessor:
                 param={"completed_actions": actions_to_run}
             )
 
+            return True
+
         except Exception as e:
-            logger.error("更新过程出错", "航图处理", e=e)
\ No newline at end of file
+            logger.error("更新过程出错", "航图处理", e=e)
+            return False
\ No newline at end of file
@@ -0,0 +1,580 @@
+"""
+Author: cg8-5712
+Date: 2025-05-02
+Version: 1.0.0
+License: GPL-3.0
+LastEditTime: 2025-07-21 16:10
+Title: eAIP Chart Renderer
+Description: Rendering helpers for turning chart PDFs into images. Supports
+rendering the full page or only a named region of it through MuPDF clip rendering,
+numbered thumbnail contact sheets of several charts, and extracting pages into a
+small standalone PDF as a cheap alternative to rasterization. Oversized pages are
+rendered in bands and streamed into the PNG encoder to keep memory bounded.
+"""
+
+import io
+import math
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Union
+
+from .eaip_cache import LRUCache
+
+# pymupdf is imported inside the render functions so that loading the plugin stays cheap
+if TYPE_CHECKING:
+    import pymupdf
+
+# Zoom used when the whole page is rendered
+BASE_ZOOM = 2.8
+# Zoom used for region renders, only the clipped area is rasterized
+REGION_ZOOM = 4.0
+
+# Named regions as normalized (x0, y0, x1, y1) rectangles of the page
+REGIONS = {
+    "tl": (0.0, 0.0, 0.5, 0.5),
+    "tr": (0.5, 0.0, 1.0, 0.5),
+    "bl": (0.0, 0.5, 0.5, 1.0),
+    "br": (0.5, 0.5, 1.0, 1.0),
+    "top": (0.0, 0.0, 1.0, 0.5),
+    "bottom": (0.0, 0.5, 1.0, 1.0),
+}
+
+# Memory budget for cached display lists of hot charts, and the estimated
+# memory of a parsed document plus display list relative to its PDF size
+DISPLAY_LIST_CACHE_BYTES = 192 * 1024 * 1024
+DISPLAY_LIST_SIZE_FACTOR = 4
+
+# Largest image of one render; bigger pages and clips get a lower zoom
+MAX_RENDER_PIXELS = 32_000_000
+# Renders above this size are rasterized in horizontal bands of at most this many
+# pixels and streamed into the PNG encoder, so memory per render stays bounded
+BAND_PIXELS = 4_000_000
+# Size of the preview used to pick colors of a banded render, as large as one band
+# so that thin colored lines are still visible in it
+PREVIEW_PIXELS = BAND_PIXELS
+# zlib level of chart PNGs; level 9 takes about six times as long on palette
+# images of charts for files only a few percent smaller
+PNG_COMPRESS_LEVEL = 6
+
+# Palette size for colored charts, and gray levels for monochrome ones
+PNG_COLORS = 32
+PNG_GRAY_LEVELS = 16
+# Saturation (0-255) above which a pixel counts as colored, and colored pixels
+# needed before a chart is treated as colored instead of gray
+COLOR_SATURATION = 40
+MIN_COLOR_PIXELS = 8
+
+# Contact sheet layout, in PDF points
+SHEET_COLUMNS = 4
+SHEET_CELL_WIDTH = 150
+SHEET_CELL_HEIGHT = 230
+SHEET_LABEL_HEIGHT = 18
+SHEET_PADDING = 6
+SHEET_ZOOM = 1.5
+MAX_SHEET_CHARTS = 48
+
+Region = Tuple[float, float, float, float]
+# A PDF file, PDF bytes, or an object with read() returning PDF bytes (archive member)
+ChartSource = Union[Path, bytes, Any]
+
+
+PageRange = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    """Options controlling how a chart is rendered
+
+    fmt is "png" for an image or "pdf" for extracted vector pages. pages is a
+    1-based inclusive range; images show its first page.
+    """
+    region: Optional[Region] = None
+    fmt: str = "png"
+    pages: Optional[PageRange] = None
+
+    @property
+    def first_page(self) -> int:
+        """0-based index of the first requested page"""
+        return self.pages[0] - 1 if self.pages else 0
+
+
+def parse_pages(value: str) -> PageRange:
+    """Parse a page number like 2 or a page range like 1-3"""
+    parts = value.strip().split("-")
+    if len(parts) > 2 or not all(p.strip().isdigit() for p in parts):
+        raise ValueError(f"Invalid page range: {value}")
+    first, last = int(parts[0]), int(parts[-1])
+    if not 1 <= first <= last:
+        raise ValueError(f"Invalid page range: {value}")
+    return first, last
+
+
+def parse_region(value: str) -> Region:
+    """Parse a region name or a normalized "x0,y0,x1,y1" clip rectangle"""
+    name = value.strip().lower()
+    if name in REGIONS:
+        return REGIONS[name]
+
+    parts = name.split(",")
+    if len(parts) != 4:
+        raise ValueError(f"Unknown region: {value}")
+    try:
+        x0, y0, x1, y1 = (float(p) for p in parts)
+    except ValueError:
+        raise ValueError(f"Invalid region: {value}")
+    if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+        raise ValueError(f"Region must be within 0-1 and non-empty: {value}")
+    return x0, y0, x1, y1
+
+
+def region_clip(page_rect: "pymupdf.Rect", region: Region) -> "pymupdf.Rect":
+    """Scale a normalized region to page coordinates"""
+    import pymupdf
+
+    x0, y0, x1, y1 = region
+    return pymupdf.Rect(
+        page_rect.x0 + x0 * page_rect.width,
+        page_rect.y0 + y0 * page_rect.height,
+        page_rect.x0 + x1 * page_rect.width,
+        page_rect.y0 + y1 * page_rect.height,
+    )
+
+
+def read_source(source: ChartSource) -> bytes:
+    """Read the PDF bytes of a chart source"""
+    if isinstance(source, (str, Path)):
+        return Path(source).read_bytes()
+    return source if isinstance(source, (bytes, bytearray)) else source.read()
+
+
+def open_document(source: ChartSource) -> "pymupdf.Document":
+    """Open a chart PDF from a file, bytes or an archive member"""
+    import pymupdf
+
+    if isinstance(source, (str, Path)):
+        return pymupdf.open(str(source))
+    return pymupdf.open(stream=read_source(source), filetype="pdf")
+
+
+class DisplayListEntry:
+    """Parsed document and display list of one page"""
+
+    __slots__ = ("doc", "display_list", "rect", "size", "lock")
+
+    def __init__(self, doc: "pymupdf.Document", display_list: "pymupdf.DisplayList",
+                 rect: "pymupdf.Rect", size: int) -> None:
+        self.doc = doc
+        self.display_list = display_list
+        self.rect = rect
+        self.size = size
+        # MuPDF objects must not be used by two threads at once
+        self.lock = threading.Lock()
+
+
+class DisplayListCache:
+    """Parsed documents and page display lists of hot charts
+
+    A page is cached from its second render on, so one-off renders do not push
+    hot charts out. Memory use is estimated from the PDF size.
+    """
+
+    def __init__(self, max_bytes: int = DISPLAY_LIST_CACHE_BYTES) -> None:
+        self._entries = LRUCache(max_items=256, max_bytes=max_bytes, sizeof=lambda x: x.size)
+        self._seen = LRUCache(max_items=1024)
+
+    def get(self, source: ChartSource, page_index: int) -> Optional[DisplayListEntry]:
+        """Get the display list of a page, None while the page is not hot yet"""
+        import pymupdf
+
+        key = (str(source), page_index)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+        if self._seen.get(key) is None:
+            self._seen.set(key, True)
+            return None
+
+        if isinstance(source, (str, Path)):
+            size = Path(source).stat().st_size
+            doc = pymupdf.open(str(source))
+        else:
+            data = read_source(source)
+            size = len(data)
+            doc = pymupdf.open(stream=data, filetype="pdf")
+        page = doc[min(page_index, doc.page_count - 1)]
+        entry = DisplayListEntry(
+            doc, page.get_displaylist(annots=True), page.rect, size * DISPLAY_LIST_SIZE_FACTOR
+        )
+        self._entries.set(key, entry)
+        return entry
+
+    def clear(self) -> None:
+        """Drop all cached documents, used when the AIRAC cycle changes"""
+        self._entries.clear()
+        self._seen.clear()
+
+
+def _capped_zoom(width: float, height: float, zoom: float) -> float:
+    """Lower zoom so that a width x height area stays within MAX_RENDER_PIXELS"""
+    pixels = width * height * zoom * zoom
+    if pixels > MAX_RENDER_PIXELS:
+        zoom *= math.sqrt(MAX_RENDER_PIXELS / pixels)
+    return zoom
+
+
+def _plan_render(page_rect: "pymupdf.Rect", options: RenderOptions) -> Tuple[Optional["pymupdf.Rect"], float]:
+    """Get clip rectangle and zoom for a render, zoom is lowered to stay within MAX_RENDER_PIXELS"""
+    if options.region:
+        clip, zoom = region_clip(page_rect, options.region), REGION_ZOOM
+    else:
+        clip, zoom = None, BASE_ZOOM
+    area = clip or page_rect
+    return clip, _capped_zoom(area.width, area.height, zoom)
+
+
+def planned_pixels(width: float, height: float, options: RenderOptions) -> float:
+    """Pixel count of a render of a page of width x height points, without opening the PDF
+
+    Plans like _plan_render, so callers holding the page size from the index know
+    up front whether a render goes through render_banded.
+
+    >>> planned_pixels(842, 1191, RenderOptions()) > BAND_PIXELS
+    True
+    >>> planned_pixels(595, 842, RenderOptions(region=REGIONS["tl"])) > BAND_PIXELS
+    False
+    """
+    zoom = BASE_ZOOM
+    if options.region:
+        x0, y0, x1, y1 = options.region
+        width, height, zoom = width * (x1 - x0), height * (y1 - y0), REGION_ZOOM
+    zoom = _capped_zoom(width, height, zoom)
+    return width * height * zoom * zoom
+
+
+def _render_pixels(area: "pymupdf.Rect", zoom: float) -> float:
+    """Pixel count of an area rendered at zoom"""
+    return area.width * area.height * zoom * zoom
+
+
+def render_page(source: ChartSource, options: Optional[RenderOptions] = None,
+                display_lists: Optional[DisplayListCache] = None) -> bytes:
+    """Render a page of a PDF to PNG bytes
+
+    With display_lists, hot charts are drawn from their cached display list
+    instead of parsing the PDF again.
+    """
+    import pymupdf
+
+    options = options or RenderOptions()
+    entry = display_lists.get(source, options.first_page) if display_lists else None
+    if entry is not None:
+        with entry.lock:
+            clip, zoom = _plan_render(entry.rect, options)
+            if _render_pixels(clip or entry.rect, zoom) > BAND_PIXELS:
+                return render_banded(entry.display_list, clip or entry.rect, zoom)
+            pix = entry.display_list.get_pixmap(
+                matrix=pymupdf.Matrix(zoom, zoom),
+                colorspace=pymupdf.csRGB,
+                alpha=False,
+                clip=clip
+            )
+        return encode_png(pix)
+
+    doc = open_document(source)
+    try:
+        page = doc[min(options.first_page, doc.page_count - 1)]
+        clip, zoom = _plan_render(page.rect, options)
+        if _render_pixels(clip or page.rect, zoom) > BAND_PIXELS:
+            return render_banded(page.get_displaylist(annots=True), clip or page.rect, zoom)
+        pix = page.get_pixmap(
+            matrix=pymupdf.Matrix(zoom, zoom),
+            clip=clip,
+            colorspace="rgb",
+            alpha=False,
+            annots=True
+        )
+        return encode_png(pix)
+    finally:
+        doc.close()
+
+
+def is_monochrome(pix: "pymupdf.Pixmap") -> bool:
+    """Check every pixel of an RGB pixmap for color
+
+    Thin colored lines such as airspace boundaries cover only a few pixels, so the
+    whole image is checked, through a saturation histogram with Pillow and through
+    the color counts of MuPDF without it.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+
+    if Image is not None:
+        image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        saturation = image.convert("HSV").getchannel("S").histogram()
+        return sum(saturation[COLOR_SATURATION + 1:]) < MIN_COLOR_PIXELS
+
+    colored = 0
+    for color, count in pix.color_count(colors=True).items():
+        high, low = max(color), min(color)
+        if high and (high - low) * 255 // high > COLOR_SATURATION:
+            colored += count
+    return colored < MIN_COLOR_PIXELS
+
+
+def encode_png(pix: "pymupdf.Pixmap") -> bytes:
+    """Encode an RGB pixmap as compact PNG
+
+    Monochrome charts become grayscale, colored charts get an adaptive palette.
+    Quantization needs Pillow; without it the grayscale or RGB pixmap is written as is.
+    """
+    import pymupdf
+
+    monochrome = is_monochrome(pix)
+    if monochrome:
+        pix = pymupdf.Pixmap(pymupdf.csGRAY, pix)
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return pix.tobytes("png")
+
+    if monochrome:
+        image = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        colors = PNG_GRAY_LEVELS
+        method = Image.Quantize.MEDIANCUT
+    else:
+        image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        colors = PNG_COLORS
+        method = Image.Quantize.FASTOCTREE
+    quantized = image.quantize(colors=colors, method=method, dither=Image.Dither.NONE)
+
+    output = io.BytesIO()
+    quantized.save(
+        output, format="PNG", compress_level=PNG_COMPRESS_LEVEL, bits=4 if colors <= 16 else 8
+    )
+    return output.getvalue()
+
+
+class PngStreamWriter:
+    """PNG encoder that compresses rows as they arrive
+
+    Only the compressed output is kept, the image itself never has to be in memory.
+    """
+
+    GRAY = 0
+    RGB = 2
+    PALETTE = 3
+
+    def __init__(self, output: io.BufferedIOBase, width: int, height: int,
+                 color_type: int, palette: Optional[bytes] = None) -> None:
+        self.output = output
+        self._compressor = zlib.compressobj(PNG_COMPRESS_LEVEL)
+        output.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        if palette:
+            self._chunk(b"PLTE", palette)
+
+    def _chunk(self, tag: bytes, data: bytes) -> None:
+        self.output.write(struct.pack(">I", len(data)))
+        self.output.write(tag)
+        self.output.write(data)
+        self.output.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+    def write_rows(self, data: bytes, stride: int) -> None:
+        """Append rows of stride bytes each, without filtering"""
+        view = memoryview(data)
+        rows = b"".join(
+            b"\x00" + view[i:i + stride] for i in range(0, len(view), stride)
+        )
+        compressed = self._compressor.compress(rows)
+        if compressed:
+            self._chunk(b"IDAT", compressed)
+
+    def close(self) -> None:
+        """Finish the image"""
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+def render_banded(display_list: "pymupdf.DisplayList", area: "pymupdf.Rect", zoom: float) -> bytes:
+    """Render a large page area band by band into a PNG
+
+    Colors are chosen once from a preview as in encode_png, then every band is
+    mapped to them and streamed into the encoder. Memory use depends on
+    BAND_PIXELS, not on the size of the chart.
+
+    >>> import pymupdf
+    >>> doc = pymupdf.open()
+    >>> page = doc.new_page(width=842, height=1191)
+    >>> _ = page.draw_line((0, 0), (842, 1191), color=(0.1, 0.3, 0.8))
+    >>> png = render_banded(page.get_displaylist(), page.rect, BASE_ZOOM)
+    >>> struct.unpack(">II", png[16:24]), png[25]
+    ((2358, 3335), 3)
+    """
+    import pymupdf
+
+    matrix = pymupdf.Matrix(zoom, zoom)
+    bbox = (area * matrix).irect
+
+    preview_zoom = zoom * min(1.0, math.sqrt(PREVIEW_PIXELS / (bbox.width * bbox.height)))
+    sample = display_list.get_pixmap(
+        matrix=pymupdf.Matrix(preview_zoom, preview_zoom),
+        colorspace=pymupdf.csRGB,
+        alpha=False,
+        clip=area
+    )
+    monochrome = is_monochrome(sample)
+    while True:
+        png, colored_band = _stream_bands(display_list, matrix, area, bbox, sample, monochrome)
+        if png is not None:
+            return png
+        # A colored line the preview lost showed up at full resolution, start over
+        # in color with the palette taken from that band
+        sample, monochrome = colored_band, False
+
+
+def _stream_bands(display_list: "pymupdf.DisplayList", matrix: "pymupdf.Matrix",
+                  area: "pymupdf.Rect", bbox: "pymupdf.IRect", sample: "pymupdf.Pixmap",
+                  monochrome: bool) -> Tuple[Optional[bytes], Optional["pymupdf.Pixmap"]]:
+    """Encode the bands of a banded render with colors taken from sample
+
+    Returns the PNG, or None and the offending band when a monochrome render meets
+    a band with color.
+    """
+    import pymupdf
+
+    width, height = bbox.width, bbox.height
+    if monochrome:
+        sample = pymupdf.Pixmap(pymupdf.csGRAY, sample)
+
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+
+    output = io.BytesIO()
+    if Image is not None:
+        mode = "L" if monochrome else "RGB"
+        image = Image.frombytes(mode, (sample.width, sample.height), sample.samples)
+        palette = image.quantize(
+            colors=PNG_GRAY_LEVELS if monochrome else PNG_COLORS,
+            method=Image.Quantize.MEDIANCUT if monochrome else Image.Quantize.FASTOCTREE,
+            dither=Image.Dither.NONE
+        )
+        writer = PngStreamWriter(
+            output, width, height, PngStreamWriter.PALETTE, bytes(palette.getpalette()[:768])
+        )
+    else:
+        writer = PngStreamWriter(
+            output, width, height, PngStreamWriter.GRAY if monochrome else PngStreamWriter.RGB
+        )
+
+    band_rows = max(1, BAND_PIXELS // width)
+    rows = 0
+    for y in range(bbox.y0, bbox.y1, band_rows):
+        band_box = pymupdf.IRect(bbox.x0, y, bbox.x1, min(y + band_rows, bbox.y1))
+        # Clip to the band in page coordinates, so content outside it is skipped
+        band = display_list.get_pixmap(
+            matrix=matrix,
+            colorspace=pymupdf.csRGB,
+            alpha=False,
+            clip=pymupdf.Rect(band_box) * ~matrix
+        )
+        if band.width != width:
+            raise RuntimeError(f"Band is {band.width} pixels wide instead of {width}")
+        rows += band.height
+        if monochrome:
+            if not is_monochrome(band):
+                return None, band
+            band = pymupdf.Pixmap(pymupdf.csGRAY, band)
+
+        if Image is None:
+            writer.write_rows(band.samples, band.width * band.n)
+            continue
+        band_image = Image.frombytes(mode, (band.width, band.height), band.samples)
+        indexed = band_image.quantize(palette=palette, dither=Image.Dither.NONE)
+        writer.write_rows(indexed.tobytes(), band.width)
+
+    # The header announced bbox.height rows, a short image would be corrupt
+    if rows != height:
+        raise RuntimeError(f"Banded render produced {rows} of {height} rows")
+    writer.close()
+    return output.getvalue(), None
+
+
+def extract_pages(source: ChartSource, options: Optional[RenderOptions] = None) -> bytes:
+    """Copy the requested pages into a minimal compressed PDF
+
+    A region is applied as crop box, the page content stays vector.
+    """
+    import pymupdf
+
+    options = options or RenderOptions(fmt="pdf")
+    src = open_document(source)
+    out = pymupdf.open()
+    try:
+        first, last = options.pages or (1, 1)
+        if first > src.page_count:
+            raise ValueError(f"Chart has only {src.page_count} pages")
+        out.insert_pdf(src, from_page=first - 1, to_page=min(last, src.page_count) - 1)
+
+        if options.region:
+            for page in out:
+                clip = region_clip(page.rect, options.region) * page.derotation_matrix
+                page.set_cropbox(clip.normalize() & page.mediabox)
+
+        return out.tobytes(garbage=4, deflate=True, clean=True)
+    finally:
+        out.close()
+        src.close()
+
+
+def render_contact_sheet(entries: List[Tuple[str, ChartSource]]) -> bytes:
+    """Render labelled first-page thumbnails of several PDFs into one PNG grid
+
+    All thumbnails are placed on a single vector page and rasterized in one pass.
+    """
+    import pymupdf
+
+    rows = (len(entries) + SHEET_COLUMNS - 1) // SHEET_COLUMNS
+    sheet = pymupdf.open()
+    try:
+        page = sheet.new_page(
+            width=SHEET_COLUMNS * SHEET_CELL_WIDTH,
+            height=max(rows, 1) * SHEET_CELL_HEIGHT
+        )
+        for i, (label, source) in enumerate(entries):
+            x = (i % SHEET_COLUMNS) * SHEET_CELL_WIDTH
+            y = (i // SHEET_COLUMNS) * SHEET_CELL_HEIGHT
+            page.insert_text(
+                (x + SHEET_PADDING, y + SHEET_LABEL_HEIGHT - 4),
+                label[:28],
+                fontsize=10
+            )
+            rect = pymupdf.Rect(
+                x + SHEET_PADDING,
+                y + SHEET_LABEL_HEIGHT,
+                x + SHEET_CELL_WIDTH - SHEET_PADDING,
+                y + SHEET_CELL_HEIGHT - SHEET_PADDING
+            )
+            page.draw_rect(rect, color=(0.75, 0.75, 0.75), width=0.5)
+            try:
+                with open_document(source) as src:
+                    page.show_pdf_page(rect, src, 0)
+            except Exception:
+                # Leave the cell empty, the label still identifies the chart
+                continue
+
+        pix = page.get_pixmap(
+            matrix=pymupdf.Matrix(SHEET_ZOOM, SHEET_ZOOM),
+            colorspace="rgb",
+            alpha=False
+        )
+        return encode_png(pix)
+    finally:
+        sheet.close()